@@ -2,340 +2,3826 @@
 # CUPP-X Ultimate by Bucky
 # Dark Tkinter GUI, English only.
 # Full, corrected version (symbol probabilities, leet, unlimited target count)
+# Headless CLI as well: tkinter is only imported when the GUI is started.
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+import argparse
+import bisect
+import collections
+import contextlib
+import csv
+import gzip
+import hashlib
+import heapq
 import itertools
+import json
+import lzma
+import math
+import mmap
+import multiprocessing
 import os
+import queue
 import random
+import shutil
+import stat
+import string
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
 from datetime import datetime
 
+# tkinter is loaded lazily by load_tk() so the CLI works on headless boxes
+tk = ttk = filedialog = messagebox = None
+
 # -------------------------
 # CONFIG / CHAR SETS
 # -------------------------
 LEET_MAP = str.maketrans("aeiostl", "4310571")
+# partial leet (see iter_partial_leet): substitutes per letter, most common first
+# (the first ones are LEET_MAP); every substitute differs from its letter
+LEET_SUBSTITUTES = {"a": "4@", "e": "3", "i": "1!", "o": "0", "s": "5$", "t": "7", "l": "1"}
+LEET_SYMBOLS = frozenset(c for subs in LEET_SUBSTITUTES.values() for c in subs if not c.isalnum())
 SYMBOL_CHARS = list(r"""!@#$%^&*()-_=+[]{};:'",.<>/?\|`~""")
 SEPARATORS = ["", ".", "_", "-"]
 COMMON_PREFIXES = ["", "the", "my", "mr", "ms", "dr"]
 COMMON_SUFFIXES = ["", "1", "12", "123", "1234", "2020", "2021", "2022", "2023", "2024", "2025", "007"]
 
 DEFAULT_WORD_CAP = 10000   # fallback if user input invalid
+PAIR_LIST_MAX = 1_000_000  # base tables up to this size are listed once for the pair stages (fast indexing)
+PAIR_SHARE_WITH_SYMBOLS = 0.5  # with symbols on, pairs may fill at most this share of what is left of the target
 
 # -------------------------
 # HELPERS
 # -------------------------
-def clean_token(tok):
+def clean_token(tok, keep=()):
+    # keep: extra characters to preserve (e.g. injected symbols)
     if tok is None:
         return ""
-    return "".join(ch for ch in str(tok) if ch.isalnum()).lower()
+    s = str(tok)
+    if s.isalnum():
+        return s.lower()
+    return "".join(ch for ch in s if ch.isalnum() or ch in keep).lower()
 
 def digit_only(s):
     return "".join(ch for ch in str(s) if ch.isdigit())
 
-def split_csv_field(s):
-    if not s:
-        return []
-    return [part.strip() for part in s.split(",") if part.strip()]
+def split_csv_field(s):
+    if not s:
+        return []
+    return [part.strip() for part in s.split(",") if part.strip()]
+
+def years_from_age(age_str):
+    ys = []
+    try:
+        if not age_str:
+            return ys
+        age = int(str(age_str).strip())
+        cy = datetime.now().year
+        by = cy - age
+        ys.append(str(by))
+        ys.append(str(by)[-2:])
+    except Exception:
+        pass
+    return ys
+
+def expand_profile_tokens(profile):
+    tokens = set()
+    def add(v):
+        if not v:
+            return
+        if isinstance(v, list):
+            for it in v:
+                s = clean_token(it)
+                if s: tokens.add(s)
+        else:
+            s = clean_token(v)
+            if s: tokens.add(s)
+    add(profile.get("first_name"))
+    add(profile.get("last_name"))
+    add(profile.get("partner"))
+    add(profile.get("pet"))
+    add(profile.get("company"))
+    add(profile.get("nicknames", []))
+    add(profile.get("keywords", []))
+    add(profile.get("years", []))
+    email = profile.get("email")
+    if email:
+        local = email.split("@", 1)[0]
+        localc = clean_token(local)
+        if localc:
+            tokens.add(localc)
+    fn = clean_token(profile.get("first_name","") or "")
+    ln = clean_token(profile.get("last_name","") or "")
+    if fn and ln:
+        tokens.add(fn + ln)
+        tokens.add(fn + "." + ln)
+        tokens.add(fn[0] + ln)
+        tokens.add(fn + ln[0])
+    return sorted(tokens)
+
+# -------------------------
+# BASE PERMUTATIONS WITHOUT SYMBOLS (compiled rule table)
+# -------------------------
+RULE_CONFIG_KEYS = ("prefixes", "suffixes", "separators")
+
+class Rule:
+    """
+    One pattern: template.format(*values) over the cartesian product of slots.
+    With distinct=(i, j) (slots i and j being the same list) slot j never takes
+    the same index as slot i, i.e. ordered pairs of different tokens.
+    kinds names what each slot holds (token, prefix, suffix, separator, year,
+    phone) for the likelihood model, see iter_ranked_wordlist.
+    Rules can be counted and indexed without building any string.
+    """
+    def __init__(self, name, template, slots, distinct=None, kinds=None):
+        self.name = name
+        self.template = template
+        self.slots = [list(s) for s in slots]
+        self.distinct = distinct
+        self.kinds = tuple(kinds) if kinds else ("token",) * len(self.slots)
+        self.radix = [len(s) for s in self.slots]
+        if distinct:
+            self.radix[distinct[1]] -= 1
+        self.count = 1
+        for r in self.radix:
+            self.count *= max(r, 0)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.count:
+            raise IndexError(idx)
+        picks = [0] * len(self.slots)
+        for pos in range(len(self.slots) - 1, -1, -1):
+            idx, picks[pos] = divmod(idx, self.radix[pos])
+        if self.distinct:
+            i, j = self.distinct
+            if picks[j] >= picks[i]:
+                picks[j] += 1
+        return self.template.format(*(slot[p] for slot, p in zip(self.slots, picks)))
+
+    def __iter__(self):
+        if not self.count:
+            return
+        if self.distinct:
+            i, j = self.distinct
+            for values in itertools.product(*(range(len(s)) for s in self.slots)):
+                if values[i] != values[j]:
+                    yield self.template.format(*(slot[p] for slot, p in zip(self.slots, values)))
+        else:
+            for values in itertools.product(*self.slots):
+                yield self.template.format(*values)
+
+class RuleTable:
+    """A sequence view over the concatenated index spaces of several rules (duplicates included)."""
+    def __init__(self, rules):
+        self.rules = [r for r in rules if len(r)]
+        self.offsets = []
+        total = 0
+        for r in self.rules:
+            self.offsets.append(total)
+            total += len(r)
+        self.size = total
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.size:
+            raise IndexError(idx)
+        k = bisect.bisect_right(self.offsets, idx) - 1
+        return self.rules[k][idx - self.offsets[k]]
+
+    def __iter__(self):
+        for r in self.rules:
+            yield from r
+
+    def counts(self):
+        return {r.name: len(r) for r in self.rules}
+
+class PermutedView:
+    """table[perm[i]]: a lazily shuffled, indexable view of a sequence."""
+    def __init__(self, seq, perm):
+        self.seq = seq
+        self.perm = perm
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, i):
+        return self.seq[self.perm[i]]
+
+    def __iter__(self):
+        for i in range(len(self.seq)):
+            yield self.seq[self.perm[i]]
+
+def compile_base_rules(tokens, birth_years=None, phones=None, use_separators=True,
+                       prefixes=None, suffixes=None, separators=None):
+    """
+    Build the RuleTable behind base_permutations. prefixes/suffixes/separators
+    default to COMMON_PREFIXES/COMMON_SUFFIXES/SEPARATORS (see load_rule_config).
+    """
+    tokens = list(tokens)
+    years = list(birth_years or [])
+    phones = [p for p in (phones or []) if p]
+    prefixes = COMMON_PREFIXES if prefixes is None else list(prefixes)
+    suffixes = COMMON_SUFFIXES if suffixes is None else list(suffixes)
+    separators = SEPARATORS if separators is None else list(separators)
+
+    short_years = [y[-2:] for y in years]
+    phone_variants = []
+    for p in phones:
+        phone_variants += [p, p[-4:], p[-3:], p[:3]]
+    phone_bases = phones + [p[-4:] for p in phones]
+
+    rules = [
+        Rule("token", "{0}", [tokens]),
+        Rule("affix", "{0}{1}{2}", [prefixes, tokens, suffixes], kinds=("prefix", "token", "suffix")),
+        Rule("token_year", "{0}{1}", [tokens, years], kinds=("token", "year")),
+        Rule("token_short_year", "{0}{1}", [tokens, short_years], kinds=("token", "year")),
+        Rule("token_phone", "{0}{1}", [tokens, phone_variants], kinds=("token", "phone")),
+        Rule("phone_token", "{1}{0}", [tokens, phone_variants], kinds=("token", "phone")),
+    ]
+    if use_separators:
+        rules += [
+            Rule("token_sep_phone", "{0}{1}{2}", [tokens, separators, phone_variants],
+                 kinds=("token", "separator", "phone")),
+            Rule("phone_sep_token", "{2}{1}{0}", [tokens, separators, phone_variants],
+                 kinds=("token", "separator", "phone")),
+            Rule("pair_sep_suffix", "{0}{1}{2}{3}", [tokens, separators, tokens, suffixes], distinct=(0, 2),
+                 kinds=("token", "separator", "token", "suffix")),
+        ]
+    else:
+        rules.append(Rule("pair", "{0}{1}", [tokens, tokens], distinct=(0, 1)))
+    rules += [
+        Rule("phone", "{0}", [phone_bases], kinds=("phone",)),
+        Rule("phone_year", "{0}{1}", [phone_bases, years], kinds=("phone", "year")),
+    ]
+    return RuleTable(rules)
+
+def base_permutations(tokens, birth_years=None, phones=None, use_separators=True, **rule_config):
+    # materialised, sorted form kept for callers that want a plain list;
+    # the generator enumerates compile_base_rules() lazily instead
+    table = compile_base_rules(tokens, birth_years=birth_years, phones=phones,
+                               use_separators=use_separators, **rule_config)
+    return sorted(set(o for o in table if o))
+
+# -------------------------
+# PASSWORD POLICY
+# -------------------------
+CHAR_CLASSES = ("lower", "upper", "digit", "symbol")
+CASE_TRANSFORMS = ("lower", "capitalize", "upper")
+
+def char_classes(word):
+    found = set()
+    for ch in word:
+        if ch.islower():
+            found.add("lower")
+        elif ch.isupper():
+            found.add("upper")
+        elif ch.isdigit():
+            found.add("digit")
+        elif not ch.isalpha():
+            found.add("symbol")
+    return found
+
+def capitalize_word(word):
+    # upper-case the first letter, wherever it is ("4lice" -> "4Lice", "!bob" -> "!Bob")
+    for i, ch in enumerate(word):
+        if ch.isalpha():
+            return word[:i] + ch.upper() + word[i + 1:]
+    return word
+
+def alnum_len(s):
+    # length of s once normalised by clean_token (lowercasing keeps the length)
+    return len(s) if s.isalnum() else sum(1 for ch in s if ch.isalnum())
+
+class PasswordPolicy:
+    """
+    What a generated word has to look like: min_len / max_len (0 = no bound),
+    require (classes from CHAR_CLASSES) and banned characters. cases lists the
+    CASE_TRANSFORMS applied to every normalised (lower-case) candidate; by default
+    "lower" only, or capitalize + upper when "upper" is required. Generation uses
+    it to prune rule slots, seeds and pair lists that cannot produce a valid word.
+    """
+    def __init__(self, min_len=0, max_len=0, require=(), banned="", cases=None):
+        self.min_len = max(0, int(min_len or 0))
+        self.max_len = max(0, int(max_len or 0))
+        if self.max_len and self.min_len > self.max_len:
+            raise ValueError(f"min length {self.min_len} is above max length {self.max_len}")
+        self.require = frozenset(require or ())
+        unknown = self.require - set(CHAR_CLASSES)
+        if unknown:
+            raise ValueError(f"unknown character class {', '.join(sorted(unknown))} "
+                             f"(expected {', '.join(CHAR_CLASSES)})")
+        self.banned = frozenset(banned or "")
+        if cases is None:
+            cases = ("capitalize", "upper") if "upper" in self.require else ("lower",)
+        unknown = set(cases) - set(CASE_TRANSFORMS)
+        if unknown or not cases:
+            raise ValueError(f"case transforms must be some of {', '.join(CASE_TRANSFORMS)}")
+        self.cases = tuple(c for c in CASE_TRANSFORMS if c in cases)
+
+    def __repr__(self):
+        return (f"PasswordPolicy(min_len={self.min_len}, max_len={self.max_len}, require={sorted(self.require)}, "
+                f"banned={''.join(sorted(self.banned))!r}, cases={list(self.cases)})")
+
+    @property
+    def needs_symbol(self):
+        return "symbol" in self.require
+
+    def length_ok(self, n):
+        return n >= self.min_len and (not self.max_len or n <= self.max_len)
+
+    def range_ok(self, lo, hi):
+        # some length in lo..hi is allowed
+        return hi >= self.min_len and (not self.max_len or lo <= self.max_len)
+
+    def accepts(self, word):
+        if not self.length_ok(len(word)):
+            return False
+        if self.banned and not self.banned.isdisjoint(word):
+            return False
+        return not self.require or self.require <= char_classes(word)
+
+    def variants(self, word):
+        """The case transforms of a normalised word that meet the policy, without repeats."""
+        out = []
+        for case in self.cases:
+            w = word if case == "lower" else capitalize_word(word) if case == "capitalize" else word.upper()
+            if w not in out and self.accepts(w):
+                out.append(w)
+        return out
+
+    def prune_rule(self, rule, slack=0, need_digit=None, check_banned=True):
+        """
+        Copy of rule keeping only slot values that can still end up in a word whose
+        normalised length plus slack (e.g. symbols added later) is within bounds and
+        (with check_banned) that contain no banned character; None when nothing can.
+        need_digit (default: digit required) also drops rules where no slot holds a digit.
+        """
+        banned = frozenset(c.lower() for c in self.banned) if check_banned else frozenset()
+        slots = [[v for v in slot if banned.isdisjoint(clean_token(v))] for slot in rule.slots]
+        lo_bound = self.min_len - slack
+        hi_bound = self.max_len - slack if self.max_len else 0
+        while True:
+            if not all(slots):
+                return None
+            lens = [[alnum_len(v) for v in slot] for slot in slots]
+            mins = [min(ls) for ls in lens]
+            maxs = [max(ls) for ls in lens]
+            lo, hi = sum(mins), sum(maxs)
+            kept = [[v for v, n in zip(slot, ls)
+                     if n + hi - maxs[i] >= lo_bound and (not hi_bound or n + lo - mins[i] <= hi_bound)]
+                    for i, (slot, ls) in enumerate(zip(slots, lens))]
+            if rule.distinct:
+                i, j = rule.distinct
+                kept[j] = kept[i]
+            if kept == slots:
+                break
+            slots = kept
+        if need_digit is None:
+            need_digit = "digit" in self.require
+        if need_digit and not any(ch.isdigit() for slot in slots for v in slot for ch in v):
+            return None
+        return Rule(rule.name, rule.template, slots, distinct=rule.distinct, kinds=rule.kinds)
+
+    def prune_table(self, table, slack=0, need_digit=None, check_banned=True):
+        pruned = (self.prune_rule(rule, slack, need_digit, check_banned) for rule in table.rules)
+        return RuleTable(r for r in pruned if r)
+
+    def prune_pair_list(self, words):
+        """Drop base words that make every pair with them too long or too short, or hold a banned character."""
+        banned = frozenset(c.lower() for c in self.banned)
+        kept = [(w, alnum_len(w)) for w in words if banned.isdisjoint(clean_token(w))]
+        if not kept:
+            return []
+        shortest = min(n for _, n in kept)
+        longest = max(n for _, n in kept)
+        return [w for w, n in kept if self.range_ok(n + shortest, n + longest)]
+
+def parse_policy(min_len=0, max_len=0, require="", banned="", cases=""):
+    """PasswordPolicy from CLI-style strings (comma separated classes / cases); None when nothing is set."""
+    require = split_csv_field(require or "")
+    cases = split_csv_field(cases or "") or None
+    if not (min_len or max_len or require or banned or cases):
+        return None
+    return PasswordPolicy(min_len, max_len, require, banned, cases)
+
+# -------------------------
+# LEET VARIANTS
+# -------------------------
+def leet_variants(word):
+    w = str(word)
+    le = w.translate(LEET_MAP)
+    return le if le and le != w else None
+
+def iter_partial_leet(word, budget=0, substitutes=LEET_SUBSTITUTES):
+    """
+    Lazily yield the partial leet forms of word ("johndoe" -> "j0hndoe",
+    "johnd0e", "johndo3", "j0hnd0e", ..., "j0hnd03"): every non-empty subset of its
+    substitutable positions, fewest substitutions first, positions in order,
+    then every combination of substitutes for them (first substitutes first).
+    Each position has distinct options (its letter or one of its substitutes),
+    so no form of one word is yielded twice. Different words can still share a
+    form ("pixel" and "pixei" both give "pixe1"), so the forms go through the
+    caller's dedup like any other candidate.
+    budget caps the forms per word (0 = all of them).
+    """
+    slots = [(i, substitutes[ch]) for i, ch in enumerate(word) if substitutes.get(ch)]
+    chars = list(word)
+    made = 0
+    for k in range(1, len(slots) + 1):
+        for combo in itertools.combinations(slots, k):
+            for picks in itertools.product(*(subs for _, subs in combo)):
+                for (i, _), c in zip(combo, picks):
+                    chars[i] = c
+                yield "".join(chars)
+                made += 1
+                if budget and made >= budget:
+                    return
+            for i, _ in combo:
+                chars[i] = word[i]
+
+# -------------------------
+# SYMBOL INJECTION (probabilistic)
+# -------------------------
+def parse_prob_weights(text, max_symbols):
+    """
+    parse a CSV of weights (weights for 0..max_symbols).
+    if invalid or length mismatch, return None => caller will use uniform default.
+    """
+    if not text:
+        return None
+    parts = [p.strip() for p in text.split(",") if p.strip() != ""]
+    try:
+        nums = [float(p) for p in parts]
+    except Exception:
+        return None
+    if len(nums) != max_symbols + 1:
+        return None
+    # if all zeros or sum zero -> invalid
+    if all(n == 0 for n in nums):
+        return None
+    return nums
+
+SYMBOL_MODES = ("auto", "sample", "exhaustive")
+
+def combinations_descending(n, k, lo=0):
+    """itertools.combinations(range(lo, n), k) in reverse order, lazily (no list of all of them)."""
+    if k == 0:
+        yield ()
+        return
+    for first in range(n - k, lo - 1, -1):
+        for rest in combinations_descending(n, k - 1, first + 1):
+            yield (first,) + rest
+
+SYMBOL_EXHAUSTIVE_LIMIT = 512   # "auto" enumerates a word's whole symbol space up to this size
+
+class SymbolInjector:
+    """
+    Symbol-injection engine, built once per run:
+      - the weights for 0..max_symbols are normalised once into cumulative weights
+      - sample(): symbol counts, symbols and insertion gaps for all tries of a word
+        are drawn in three batched rng.choices calls, strings are built by slicing
+      - exhaustive(): every distinct insertion (k symbols at any of C(L+k, k) slot
+        sets, any symbols) in canonical order, lazily; used by "auto" when
+        space_size(len(word)) <= exhaustive_limit
+    Counts with zero weight are never produced. tail_first makes exhaustive() start
+    with the symbols at the end of the word (the most common placement).
+    """
+    def __init__(self, max_symbols, symbol_chars, rng, prob_weights=None, mode="auto",
+                 exhaustive_limit=SYMBOL_EXHAUSTIVE_LIMIT, tail_first=False):
+        if mode not in SYMBOL_MODES:
+            raise ValueError(f"unknown symbol mode {mode!r} (expected one of {', '.join(SYMBOL_MODES)})")
+        self.max_symbols = max(0, int(max_symbols))
+        self.symbol_chars = list(symbol_chars)
+        self.rng = rng
+        self.mode = mode
+        self.exhaustive_limit = exhaustive_limit
+        self.tail_first = tail_first
+        if not prob_weights or len(prob_weights) != self.max_symbols + 1 or sum(prob_weights) <= 0:
+            prob_weights = [1.0] * (self.max_symbols + 1)
+        total = float(sum(prob_weights))
+        self.counts = list(range(self.max_symbols + 1))
+        self.cum_weights = list(itertools.accumulate(w / total for w in prob_weights))
+        self.support = [k for k, w in enumerate(prob_weights) if w > 0]
+        self.tries = max(8, min(200, self.max_symbols * 12))
+        self._space_cache = {}
+
+    def space_size(self, length):
+        """Number of distinct variants of a word of this length (capped at exhaustive_limit + 1)."""
+        if length in self._space_cache:
+            return self._space_cache[length]
+        cap = self.exhaustive_limit + 1
+        n = len(self.symbol_chars)
+        total = 0
+        for k in self.support:
+            total += math.comb(length + k, k) * n ** k
+            if total >= cap:
+                total = cap
+                break
+        self._space_cache[length] = total
+        return total
+
+    def variants(self, word):
+        if not word:
+            return iter(())
+        if self.mode == "exhaustive" or (self.mode == "auto" and self.space_size(len(word)) <= self.exhaustive_limit):
+            return self.exhaustive(word)
+        return iter(self.sample(word))
+
+    def exhaustive(self, word):
+        L = len(word)
+        for k in self.support:
+            if k == 0:
+                yield word
+                continue
+            if self.tail_first:
+                slot_sets = combinations_descending(L + k, k)
+            else:
+                slot_sets = itertools.combinations(range(L + k), k)
+            for slots in slot_sets:
+                for syms in itertools.product(self.symbol_chars, repeat=k):
+                    pieces = []
+                    prev = 0
+                    for i, (slot, s) in enumerate(zip(slots, syms)):
+                        at = slot - i   # position in word before which s goes
+                        pieces.append(word[prev:at])
+                        pieces.append(s)
+                        prev = at
+                    pieces.append(word[prev:])
+                    yield "".join(pieces)
+
+    def sample(self, word):
+        """Distinct sampled variants in the order drawn (like inject_symbols_by_probability), at most 300."""
+        rng = self.rng
+        L = len(word)
+        ks = rng.choices(self.counts, cum_weights=self.cum_weights, k=self.tries)
+        total = sum(ks)
+        syms = rng.choices(self.symbol_chars, k=total) if total else []
+        gaps = rng.choices(range(L + 1), k=total) if total else []
+        variants = {}   # insertion-ordered, so a seed gives the same stream in every process
+        pos = 0
+        for k in ks:
+            if k == 0:
+                variants[word] = None
+                continue
+            picks = sorted(zip(gaps[pos:pos + k], syms[pos:pos + k]), key=lambda gs: gs[0])
+            pos += k
+            pieces = []
+            prev = 0
+            for g, s in picks:
+                pieces.append(word[prev:g])
+                pieces.append(s)
+                prev = g
+            pieces.append(word[prev:])
+            variants["".join(pieces)] = None
+            if len(variants) >= 300:
+                break
+        return list(variants)
+
+def inject_symbols_by_probability(word, max_symbols, symbol_chars, rng, prob_weights=None):
+    """
+    Return a set of variants for a single word.
+    Each variant is created by:
+      - sampling k from 0..max_symbols using prob_weights (or uniform)
+      - if k==0, variant may be the original word
+      - if k>0, insert k symbols at random insertion positions
+    We produce a sampled set (not exhaustive) to avoid explosion.
+    For many words build one SymbolInjector and call sample() instead.
+    """
+    if not word:
+        return set()
+    return set(SymbolInjector(max_symbols, symbol_chars, rng, prob_weights, mode="sample").sample(word))
+
+# -------------------------
+# LAZY PAIR ENUMERATION
+# -------------------------
+MASK64 = (1 << 64) - 1
+
+class IndexPermutation:
+    """
+    Pseudo-random bijection over range(size) in O(1) memory: a few keyed rounds of
+    add / odd multiply / xor-shift, each a bijection modulo the next power of two,
+    cycle-walked back into range (under 2 steps per index on average). Keys come from rng.
+    """
+    ROUNDS = 3
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.bits = max(1, (max(size, 1) - 1).bit_length())
+        self.mask = (1 << self.bits) - 1
+        self.shift = self.bits // 2 + 1
+        self.keys = [(rng.getrandbits(64) & self.mask, rng.getrandbits(64) & self.mask | 1)
+                     for _ in range(self.ROUNDS)]
+
+    def _encrypt(self, x):
+        mask, shift = self.mask, self.shift
+        for add, mul in self.keys:
+            x = ((x + add) * mul) & mask
+            x ^= x >> shift
+        return x
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        x = self._encrypt(i)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+def pair_space_size(n_tokens, separators):
+    return n_tokens * (n_tokens - 1) * len(separators)
+
+def pair_at(tokens, separators, idx):
+    """Decode an index of the (a, b, sep) space, a != b, into f"{a}{sep}{b}"."""
+    n = len(tokens)
+    pair, s = divmod(idx, len(separators))
+    ai, bi = divmod(pair, n - 1)
+    if bi >= ai:
+        bi += 1
+    return f"{tokens[ai]}{separators[s]}{tokens[bi]}"
+
+class LengthBandedPairs:
+    """
+    The (a, b, sep) pair space restricted to pairs whose normalised length
+    (alnum_len(a) + alnum_len(b)) is within min_len..max_len (0 = no maximum).
+    Tokens are ordered by length, so each left token's partners are one
+    contiguous run; cumulative run sizes map an index to its pair in O(log n).
+    """
+    def __init__(self, tokens, separators, min_len=0, max_len=0):
+        lens = [alnum_len(t) for t in tokens]
+        self.order = sorted(range(len(tokens)), key=lens.__getitem__)
+        self.tokens = tokens
+        self.separators = separators
+        slens = [lens[i] for i in self.order]
+        self.lo, self.hi = array("q"), array("q")
+        self.cum = array("q", [0])
+        total = 0
+        for p, n in enumerate(slens):
+            lo = bisect.bisect_left(slens, min_len - n)
+            hi = bisect.bisect_right(slens, max_len - n) if max_len else len(slens)
+            hi = max(lo, hi)
+            total += hi - lo - (1 if lo <= p < hi else 0)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.cum.append(total)
+
+    def __len__(self):
+        return self.cum[-1] * len(self.separators)
+
+    def __getitem__(self, idx):
+        pair, s = divmod(idx, len(self.separators))
+        p = bisect.bisect_right(self.cum, pair) - 1
+        lo = self.lo[p]
+        q = lo + pair - self.cum[p]
+        if lo <= p < self.hi[p] and q >= p:
+            q += 1   # a token is not paired with itself
+        return f"{self.tokens[self.order[p]]}{self.separators[s]}{self.tokens[self.order[q]]}"
+
+def iter_token_pairs(tokens, separators, rng, start=0, step=1, lengths=None):
+    """
+    Every ordered pair of distinct tokens joined by every separator, in uniform
+    pseudo-random order, built one string at a time (no list, no cap).
+    start/step take a slice of the permuted order (one shard of it).
+    lengths=(min_len, max_len) walks only the pairs of that normalised length
+    (see LengthBandedPairs; tokens must then be a list).
+    """
+    if lengths is not None:
+        space = LengthBandedPairs(tokens, separators, *lengths)
+        size = len(space)
+    else:
+        space = None
+        size = pair_space_size(len(tokens), separators)
+    if size <= 0:
+        return
+    perm = IndexPermutation(size, rng)
+    for i in range(start, size, step):
+        yield space[perm[i]] if space is not None else pair_at(tokens, separators, perm[i])
+
+# -------------------------
+# DEDUP BACKENDS
+# -------------------------
+# Every backend has add(word) -> True if the word is new, len() and close().
+# Approximate memory per million unique candidates:
+#   set    exact strings in a Python set            ~90-120 MB
+#   hash   64-bit hashes, array open addressing     ~11-23 MB (exact up to a ~1e-8 collision chance at 1M)
+#   bloom  Bloom filter, fp_rate=0.001 (default)    ~1.8 MB   (a false positive drops a new word, never emits a dupe)
+#   spill  64-bit hashes, sorted runs on disk        RAM fixed by buffer_items (~70 MB at 1M), 8 MB disk
+DEDUP_MODES = ("set", "hash", "bloom", "spill")
+
+def word_hash64(word):
+    # stable across processes/runs (unlike hash()), never 0 (0 marks an empty slot)
+    h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1
+
+class SetDedup:
+    """Exact dedup on the strings themselves (the original behaviour)."""
+    def __init__(self):
+        self.seen = set()
+
+    def add(self, word):
+        if word in self.seen:
+            return False
+        self.seen.add(word)
+        return True
+
+    def __len__(self):
+        return len(self.seen)
+
+    def close(self):
+        self.seen = set()
+
+class HashDedup:
+    """
+    Exact dedup on 64-bit hashes stored in an array('Q') open-addressing table
+    (linear probing, grows x2 at 70% load). 8 bytes per slot instead of a str object.
+    """
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity=0):
+        size = 1 << 10
+        while size * self.MAX_LOAD < (capacity or 0):
+            size <<= 1
+        self._alloc(size)
+        self.count = 0
+
+    def _alloc(self, size):
+        self.table = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.limit = int(size * self.MAX_LOAD)
+
+    def _insert(self, h):
+        table, mask = self.table, self.mask
+        i = h & mask
+        while True:
+            cur = table[i]
+            if cur == 0:
+                table[i] = h
+                return True
+            if cur == h:
+                return False
+            i = (i + 1) & mask
+
+    def add_hash(self, h):
+        if not self._insert(h):
+            return False
+        self.count += 1
+        if self.count > self.limit:
+            old = self.table
+            self._alloc(len(old) * 2)
+            for h2 in old:
+                if h2:
+                    self._insert(h2)
+        return True
+
+    def add(self, word):
+        return self.add_hash(word_hash64(word))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._alloc(1 << 10)
+        self.count = 0
+
+class BloomDedup:
+    """
+    Approximate dedup with a scalable Bloom filter: each layer is sized for its
+    capacity at the requested false-positive rate; when a layer is full a new one
+    with twice the capacity and half the fp rate is added, so the total rate stays
+    below ~2x fp_rate. False positives only ever drop new words.
+    """
+    def __init__(self, capacity=0, fp_rate=0.001):
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        self.fp_rate = fp_rate
+        self.layers = []
+        self.count = 0
+        self._add_layer(max(int(capacity or 0), 100_000), fp_rate)
+
+    def _add_layer(self, capacity, fp_rate):
+        nbits = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        k = max(1, int(round(nbits / capacity * math.log(2))))
+        self.layers.append([bytearray((nbits + 7) // 8), nbits, k, capacity, 0, fp_rate])
+
+    @staticmethod
+    def _hashes(word):
+        d = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+
+    @staticmethod
+    def _test(layer, h1, h2):
+        bits, nbits, k = layer[0], layer[1], layer[2]
+        for i in range(k):
+            p = (h1 + i * h2) % nbits
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def __contains__(self, word):
+        h1, h2 = self._hashes(word)
+        return any(self._test(layer, h1, h2) for layer in self.layers)
+
+    def add(self, word):
+        h1, h2 = self._hashes(word)
+        for layer in self.layers:
+            if self._test(layer, h1, h2):
+                return False
+        layer = self.layers[-1]
+        if layer[4] >= layer[3]:
+            self._add_layer(layer[3] * 2, layer[5] / 2)
+            layer = self.layers[-1]
+        bits, nbits, k = layer[0], layer[1], layer[2]
+        for i in range(k):
+            p = (h1 + i * h2) % nbits
+            bits[p >> 3] |= 1 << (p & 7)
+        layer[4] += 1
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.layers = []
+
+class SpillDedup:
+    """
+    Exact (64-bit hash) dedup for targets beyond RAM: new hashes go to an in-memory
+    buffer; a full buffer is sorted and written to disk as a run of uint64s.
+    Runs are binary-searched through mmap and merged size-tiered, as in an LSM
+    store: a run's tier is log base fanout of its size in buffers, and once a tier
+    holds fanout runs they are merged into one run of the next tier. Every hash is
+    rewritten about once per tier, so total I/O grows as n log n, not quadratically,
+    and there are at most about fanout runs per tier to search.
+    Files live in a temp dir removed by close().
+    """
+    def __init__(self, buffer_items=1 << 20, fanout=4, spill_dir=None):
+        self.buffer_items = max(1, int(buffer_items))
+        self.fanout = max(2, int(fanout))
+        self.dir = tempfile.mkdtemp(prefix="cuppx-dedup-", dir=spill_dir)
+        self.buffer = set()
+        self.runs = []      # [(path, fh, mmap, memoryview)]
+        self.count = 0
+        self._serial = 0
+
+    def add(self, word):
+        h = word_hash64(word)
+        if h in self.buffer:
+            return False
+        for run in self.runs:
+            mv = run[3]
+            i = bisect.bisect_left(mv, h)
+            if i < len(mv) and mv[i] == h:
+                return False
+        self.buffer.add(h)
+        self.count += 1
+        if len(self.buffer) >= self.buffer_items:
+            self._spill(array("Q", sorted(self.buffer)))
+            self.buffer = set()
+            self._compact()
+        return True
+
+    def _spill(self, arr):
+        self._serial += 1
+        path = os.path.join(self.dir, f"run{self._serial:06d}.bin")
+        with open(path, "wb") as fh:
+            arr.tofile(fh)
+        self.runs.append(self._open_run(path))
+
+    @staticmethod
+    def _open_run(path):
+        fh = open(path, "rb")
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return (path, fh, mm, memoryview(mm).cast("Q"))
+
+    @staticmethod
+    def _close_run(run):
+        path, fh, mm, mv = run
+        mv.release()
+        mm.close()
+        fh.close()
+
+    def _tier(self, run):
+        tier, size = 0, len(run[3])
+        while size >= self.buffer_items * self.fanout ** (tier + 1):
+            tier += 1
+        return tier
+
+    def _compact(self):
+        # merge the runs of the lowest full tier, until no tier is full
+        while True:
+            tiers = {}
+            for run in self.runs:
+                tiers.setdefault(self._tier(run), []).append(run)
+            full = [t for t, runs in tiers.items() if len(runs) >= self.fanout]
+            if not full:
+                return
+            self._merge(tiers[min(full)])
+
+    def _merge(self, runs):
+        self._serial += 1
+        path = os.path.join(self.dir, f"run{self._serial:06d}.bin")
+        with open(path, "wb") as out:
+            chunk = array("Q")
+            for h in heapq.merge(*(run[3] for run in runs)):
+                chunk.append(h)
+                if len(chunk) >= 1 << 16:
+                    chunk.tofile(out)
+                    chunk = array("Q")
+            chunk.tofile(out)
+        for run in runs:
+            self._close_run(run)
+            os.remove(run[0])
+        merged = {run[0] for run in runs}
+        self.runs = [run for run in self.runs if run[0] not in merged] + [self._open_run(path)]
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for run in self.runs:
+            self._close_run(run)
+        self.runs = []
+        self.buffer = set()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def make_dedup(mode="set", capacity=0, fp_rate=0.001, spill_dir=None, buffer_items=1 << 20):
+    """Build a dedup backend by name (see DEDUP_MODES); capacity is a sizing hint."""
+    if mode == "set":
+        return SetDedup()
+    if mode == "hash":
+        return HashDedup(capacity)
+    if mode == "bloom":
+        return BloomDedup(capacity, fp_rate)
+    if mode == "spill":
+        return SpillDedup(buffer_items=buffer_items, spill_dir=spill_dir)
+    raise ValueError(f"unknown dedup mode {mode!r} (expected one of {', '.join(DEDUP_MODES)})")
+
+# -------------------------
+# EXCLUSION INDEX (words the cracker already tries)
+# -------------------------
+# Built once from big dictionaries (rockyou & co.) with build_exclusion_index and
+# memory-mapped at run time, so a lookup costs a binary search / k bit tests on
+# pages the OS caches, not RAM for the dictionary. Formats:
+#   sorted  header, sorted unique word_hash64 values (uint64, native byte order),
+#           then a directory of where each top-bits bucket of hashes starts, so a
+#           lookup bisects ~8 entries: exact up to 64-bit collisions, ~9 bytes per word
+#   bloom   header + Bloom filter bits (BloomDedup hashing): ~1.8 bytes per word at
+#           fp_rate=0.001; a false positive drops a candidate that was not listed
+# Dictionary lines are hashed as raw bytes, so lines that are not UTF-8 never match.
+EXCLUSION_FORMATS = ("sorted", "bloom")
+EXCLUSION_MAGIC = {"sorted": b"CUPPXHS1", "bloom": b"CUPPXBF1"}
+EXCLUSION_SORT_ITEMS = 1 << 21   # hashes sorted in memory per run while building
+EXCLUSION_BUCKET = 8              # sorted format: hashes per directory bucket (about)
+EXCLUSION_MAX_BITS = 20           # directory size cap (2**20 buckets, 8 MB)
+
+def open_dictionary(path):
+    # binary line reader; .gz / .xz dictionaries are read as they are
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".gz":
+        return gzip.open(path, "rb")
+    if ext == ".xz":
+        return lzma.open(path, "rb")
+    return open(path, "rb", buffering=1 << 20)
+
+def iter_dictionary_lines(paths):
+    for path in paths:
+        with open_dictionary(path) as fh:
+            for line in fh:
+                line = line.rstrip(b"\r\n")
+                if line:
+                    yield line
+
+def build_exclusion_index(dict_paths, index_path, fmt="sorted", fp_rate=0.001, sort_items=EXCLUSION_SORT_ITEMS,
+                          tmp_dir=None):
+    """
+    One-off: build an exclusion index (see EXCLUSION_FORMATS) from one or more
+    dictionary files into index_path (written atomically). The sorted format is
+    built by an external sort (runs of sort_items hashes merged from disk); the
+    bloom format reads the dictionaries twice (count, then fill).
+    Returns {"format", "lines", "entries", "bytes"}.
+    """
+    if fmt not in EXCLUSION_FORMATS:
+        raise ValueError(f"unknown exclusion format {fmt!r} (expected one of {', '.join(EXCLUSION_FORMATS)})")
+    if not 0 < fp_rate < 1:
+        raise ValueError("fp_rate must be between 0 and 1")
+    d = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp = tempfile.mkstemp(dir=d, prefix="." + os.path.basename(index_path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if fmt == "sorted":
+                lines, entries = _write_sorted_index(out, dict_paths, sort_items, tmp_dir)
+            else:
+                lines, entries = _write_bloom_index(out, dict_paths, fp_rate)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, index_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    return {"format": fmt, "lines": lines, "entries": entries, "bytes": os.path.getsize(index_path)}
+
+def _write_sorted_index(out, dict_paths, sort_items, tmp_dir):
+    run_dir = tempfile.mkdtemp(prefix="cuppx-exclusion-", dir=tmp_dir)
+    runs = []   # SpillDedup-style (path, fh, mmap, memoryview) sorted runs
+    lines = 0
+    try:
+        buf = set()
+        for line in iter_dictionary_lines(dict_paths):
+            # same values as word_hash64 of the decoded word
+            buf.add(int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little") or 1)
+            lines += 1
+            if len(buf) >= sort_items:
+                runs.append(_spill_hashes(run_dir, len(runs), buf))
+                buf = set()
+        if buf:
+            runs.append(_spill_hashes(run_dir, len(runs), buf))
+        # runs are unique each, so their total bounds the entry count
+        most = sum(len(run[3]) for run in runs)
+        bits = min(EXCLUSION_MAX_BITS, max(0, (most // EXCLUSION_BUCKET).bit_length()))
+        shift = 64 - bits
+        directory = array("Q", bytes(8 * ((1 << bits) + 1)))
+        out.write(EXCLUSION_MAGIC["sorted"] + bytes(16))
+        entries, last = 0, None
+        chunk = array("Q")
+        for h in heapq.merge(*(run[3] for run in runs)):
+            if h != last:
+                chunk.append(h)
+                directory[(h >> shift) + 1] += 1
+                last = h
+                if len(chunk) >= 1 << 16:
+                    chunk.tofile(out)
+                    entries += len(chunk)
+                    chunk = array("Q")
+        chunk.tofile(out)
+        entries += len(chunk)
+        for b in range(1, len(directory)):
+            directory[b] += directory[b - 1]
+        directory.tofile(out)
+        out.seek(len(EXCLUSION_MAGIC["sorted"]))
+        out.write(entries.to_bytes(8, sys.byteorder) + bits.to_bytes(8, sys.byteorder))
+        out.seek(0, os.SEEK_END)
+        return lines, entries
+    finally:
+        for run in runs:
+            SpillDedup._close_run(run)
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def _spill_hashes(run_dir, serial, hashes):
+    path = os.path.join(run_dir, f"run{serial:06d}.bin")
+    with open(path, "wb") as fh:
+        array("Q", sorted(hashes)).tofile(fh)
+    return SpillDedup._open_run(path)
+
+def _write_bloom_index(out, dict_paths, fp_rate):
+    lines = sum(1 for _ in iter_dictionary_lines(dict_paths))
+    capacity = max(lines, 1000)
+    nbits = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+    k = max(1, int(round(nbits / capacity * math.log(2))))
+    bits = bytearray((nbits + 7) // 8)
+    for line in iter_dictionary_lines(dict_paths):
+        digest = hashlib.blake2b(line, digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(k):
+            p = (h1 + i * h2) % nbits
+            bits[p >> 3] |= 1 << (p & 7)
+    out.write(EXCLUSION_MAGIC["bloom"] + b"".join(v.to_bytes(8, sys.byteorder) for v in (nbits, k, lines)))
+    out.write(bits)
+    return lines, lines
+
+class ExclusionIndex:
+    """
+    Read-only, memory-mapped exclusion index built by build_exclusion_index;
+    `word in index` tests a candidate. Pickles as its path (shard / batch workers
+    map the file themselves).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.base = self.view = self.directory = None
+        self.fh = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # empty file
+            self.fh.close()
+            raise ValueError(f"{path}: not an exclusion index (build one with --build-exclusion)")
+        magic = self.mm[:8]
+        formats = {v: k for k, v in EXCLUSION_MAGIC.items()}
+        if magic not in formats:
+            self.close()
+            raise ValueError(f"{path}: not an exclusion index (build one with --build-exclusion)")
+        self.format = formats[magic]
+        if self.format == "sorted":
+            self.count, bits = (int.from_bytes(self.mm[o:o + 8], sys.byteorder) for o in (8, 16))
+            self.shift = 64 - bits
+            self.base = memoryview(self.mm).cast("Q")
+            self.view = self.base[3:3 + self.count]
+            self.directory = self.base[3 + self.count:]
+        else:
+            self.nbits, self.k, self.count = (int.from_bytes(self.mm[o:o + 8], sys.byteorder) for o in (8, 16, 24))
+            self.offset = 32
+
+    def __contains__(self, word):
+        if self.view is not None:
+            h = word_hash64(word)
+            b = h >> self.shift
+            hi = self.directory[b + 1]
+            i = bisect.bisect_left(self.view, h, self.directory[b], hi)
+            return i < hi and self.view[i] == h
+        h1, h2 = BloomDedup._hashes(word)
+        mm, nbits, off = self.mm, self.nbits, self.offset
+        for i in range(self.k):
+            p = (h1 + i * h2) % nbits
+            if not mm[off + (p >> 3)] & (1 << (p & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def close(self):
+        for mv in (self.view, self.directory, self.base):
+            if mv is not None:
+                mv.release()
+        self.base = self.view = self.directory = None
+        if not self.mm.closed:
+            self.mm.close()
+        self.fh.close()
+
+class Exclusions:
+    """Several exclusion indexes as one: `word in exclusions` if any of them lists it."""
+    def __init__(self, paths):
+        self.indexes = []
+        try:
+            for p in paths:
+                self.indexes.append(ExclusionIndex(p))
+        except BaseException:
+            self.close()
+            raise
+
+    def __contains__(self, word):
+        for idx in self.indexes:
+            if word in idx:
+                return True
+        return False
+
+    def __len__(self):
+        return sum(len(idx) for idx in self.indexes)
+
+    def close(self):
+        for idx in self.indexes:
+            idx.close()
+        self.indexes = []
+
+# -------------------------
+# STATS / PROFILING
+# -------------------------
+class StageStats:
+    # exit: target | share (pairs left room for symbols) | exhausted | disabled | skipped | closed | cancelled
+    #       | policy (no word could meet the password policy) | seeds (only symbol seeds were needed)
+    # rejected: candidates none of whose case variants met the password policy
+    # duplicates / excluded: candidates none of whose (case variant) words were new / unlisted,
+    # counted per candidate like proposed; accepted counts words, so with case variants it
+    # can exceed proposed
+    __slots__ = ("name", "proposed", "accepted", "duplicates", "empty", "rejected", "excluded", "seconds", "exit")
+
+    def __init__(self, name):
+        self.name = name
+        self.proposed = self.accepted = self.duplicates = self.empty = self.rejected = self.excluded = 0
+        self.seconds = 0.0
+        self.exit = None
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class GenerationStats:
+    """
+    Per-stage counters filled in by iter_final_wordlist(stats=...): candidates
+    proposed, accepted, rejected as duplicates or as empty after normalisation,
+    generator time (time spent in the consumer is excluded) and why the stage ended.
+    Safe to read from another thread while a run is going (GUI status bar).
+    """
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+        self.target_count = 0
+        self.started = self.finished = None
+
+    def start(self, target_count):
+        self.target_count = target_count
+        self.started = time.perf_counter()
+
+    def begin(self, name):
+        st = self.stages[name] = StageStats(name)
+        self.current = name
+        return st
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        self.current = None
+
+    @property
+    def accepted(self):
+        return sum(st.accepted for st in self.stages.values())
+
+    @property
+    def exit_reason(self):
+        """Why the run ended: cancelled, closed, target, or exhausted (every stage ran dry first)."""
+        for reason in ("cancelled", "closed"):
+            if any(st.exit == reason for st in self.stages.values()):
+                return reason
+        if self.target_count and self.accepted >= self.target_count:
+            return "target"
+        return "exhausted" if self.stages else None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def status_line(self):
+        parts = []
+        for st in self.stages.values():
+            if st.proposed:
+                dup = 100.0 * st.duplicates / st.proposed
+                parts.append(f"{st.name} {st.accepted:,} ({dup:.0f}% dup)")
+        if self.current:
+            parts.append(f"now: {self.current}")
+        return " | ".join(parts)
+
+    def summary(self):
+        lines = [f"{'stage':<9}{'proposed':>11}{'accepted':>11}{'dups':>10}{'empty':>8}{'policy':>9}{'excluded':>10}"
+                 f"{'secs':>9}{'words/s':>11}  exit"]
+        for st in self.stages.values():
+            rate = st.accepted / st.seconds if st.seconds > 0 else 0.0
+            lines.append(f"{st.name:<9}{st.proposed:>11,}{st.accepted:>11,}{st.duplicates:>10,}{st.empty:>8,}"
+                         f"{st.rejected:>9,}{st.excluded:>10,}{st.seconds:>9.3f}{rate:>11,.0f}  {st.exit or '-'}")
+        total = self.accepted
+        short = self.exit_reason == "exhausted" and self.target_count and total < self.target_count
+        lines.append(f"total {total:,} words in {self.elapsed:.3f}s"
+                     + (f" (short of target {self.target_count:,}: every stage exhausted)" if short else ""))
+        return "\n".join(lines)
+
+    def as_dict(self):
+        return {"target_count": self.target_count, "accepted": self.accepted, "elapsed": self.elapsed,
+                "exit_reason": self.exit_reason, "stages": [st.as_dict() for st in self.stages.values()]}
+
+@contextlib.contextmanager
+def profiled(cprofile_path=None, trace_memory=False, stream=None, top=15):
+    """
+    Optionally wrap a run in cProfile (stats dumped to cprofile_path, top functions
+    printed) and/or tracemalloc (peak traced memory and top allocation sites printed).
+    """
+    stream = stream or sys.stderr
+    prof = None
+    if cprofile_path:
+        import cProfile
+        prof = cProfile.Profile()
+    if trace_memory:
+        tracemalloc.start()
+    if prof:
+        prof.enable()
+    try:
+        yield
+    finally:
+        if prof:
+            prof.disable()
+            import pstats
+            prof.dump_stats(cprofile_path)
+            print(f"[cuppx] cProfile stats written to {cprofile_path}", file=stream)
+            pstats.Stats(prof, stream=stream).sort_stats("cumulative").print_stats(top)
+        if trace_memory:
+            snap = tracemalloc.take_snapshot()
+            cur, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"[cuppx] tracemalloc: current {cur / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB", file=stream)
+            for entry in snap.statistics("lineno")[:top]:
+                print(f"  {entry}", file=stream)
+
+# -------------------------
+# STAGE CACHE
+# -------------------------
+def cache_key(stage, *inputs):
+    """Content address of a stage output: the stage name plus a hash of its (JSON-able) inputs."""
+    blob = json.dumps([stage, inputs], sort_keys=True, separators=(",", ":"), default=str)
+    return stage + "-" + hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+class StageCache:
+    """
+    LRU cache for upstream stage outputs (lists of strings) keyed by cache_key(), so
+    runs that only change downstream options (target, leet, symbols, dedup) reuse the
+    expanded tokens and the listed base table. max_items caps the number of cached
+    strings held in memory. With disk_dir the entries are also kept there as
+    gzip'd JSON, shared between runs and shard processes; the least recently used
+    files are removed once the directory holds more than disk_max_bytes.
+    """
+    DISK_SUFFIX = ".json.gz"
+
+    def __init__(self, max_items=4_000_000, disk_dir=None, disk_max_bytes=512 << 20):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = collections.OrderedDict()
+        self.items = 0
+        self.hits = self.disk_hits = self.misses = 0
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # shard processes get a copy (minus the lock)
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key + self.DISK_SUFFIX)
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self.load(key)
+        if value is not None:
+            with self.lock:
+                self.disk_hits += 1
+            self.remember(key, value)
+        return value
+
+    def put(self, key, value):
+        value = list(value)
+        self.remember(key, value)
+        self.store(key, value)
+        return value
+
+    def fetch(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            with self.lock:
+                self.misses += 1
+            value = self.put(key, compute())
+        return value
+
+    def remember(self, key, value):
+        if len(value) > self.max_items:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.items -= len(old)
+            self.entries[key] = value
+            self.items += len(value)
+            while self.items > self.max_items:
+                _, dropped = self.entries.popitem(last=False)
+                self.items -= len(dropped)
+
+    def load(self, key):
+        if not self.disk_dir:
+            return None
+        path = self.disk_path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                value = json.load(fh)
+            os.utime(path)
+        except (OSError, ValueError, EOFError):
+            return None
+        return value if isinstance(value, list) else None
+
+    def store(self, key, value):
+        if not self.disk_dir:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix=".cache-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) as fh:
+                fh.write(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp, self.disk_path(key))
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            return
+        self.evict_disk()
+
+    def evict_disk(self):
+        files = []
+        with os.scandir(self.disk_dir) as it:
+            for e in it:
+                if e.name.endswith(self.DISK_SUFFIX):
+                    with contextlib.suppress(OSError):
+                        st = e.stat()
+                        files.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.items = 0
+
+    def summary(self):
+        return (f"cache: {self.hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses, "
+                f"{len(self.entries)} entries / {self.items:,} strings in memory")
+
+def profile_cache_key(profile):
+    # the profile as the token expansion sees it, whatever shape it came in
+    return {k: profile.get(k) for k in sorted(profile)}
+
+# -------------------------
+# LIKELIHOOD MODEL (best-first enumeration)
+# -------------------------
+# A candidate's score is the product of the weights of what it is made of: the
+# source of each profile token, year or phone in it, each transform applied
+# (non-empty prefix / suffix / separator, two tokens joined, leet) and the number
+# of injected symbols. Weights are relative; 0 leaves a part out entirely.
+SCORE_GROUPS = {
+    "source": {"name": 1.0, "nickname": 0.8, "pet": 0.7, "partner": 0.6, "email": 0.6,
+               "keyword": 0.5, "company": 0.4, "year": 0.6, "phone": 0.4},
+    "transform": {"prefix": 0.2, "suffix": 0.5, "separator": 0.4, "pair": 0.3, "leet": 0.3},
+}
+RANKED_SYMBOL_DECAY = 0.1   # default weight per injected symbol when no symbol weights are given
+ORDERS = ("shuffle", "ranked")
+
+def merge_score_weights(overrides=None):
+    """SCORE_GROUPS updated from {"source": {...}, "transform": {...}, "symbols": [w0, w1, ...]}."""
+    weights = {group: dict(values) for group, values in SCORE_GROUPS.items()}
+    weights["symbols"] = None
+    for group, values in (overrides or {}).items():
+        if group == "symbols":
+            if values is not None and (not isinstance(values, list) or any(float(v) < 0 for v in values)):
+                raise ValueError("symbols must be a list of weights >= 0 for 0..max symbols")
+            weights["symbols"] = None if values is None else [float(v) for v in values]
+            continue
+        if group not in weights or not isinstance(values, dict):
+            raise ValueError(f"unknown weight group {group!r} (expected source, transform or symbols)")
+        for key, w in values.items():
+            if key not in weights[group]:
+                raise ValueError(f"unknown {group} weight {key!r} (expected one of {', '.join(weights[group])})")
+            if float(w) < 0:
+                raise ValueError(f"{group}.{key} must be >= 0")
+            weights[group][key] = float(w)
+    return weights
+
+def load_score_weights(path):
+    """Load likelihood weights (see SCORE_GROUPS) from JSON/YAML."""
+    try:
+        return merge_score_weights(read_mapping_file(path))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{path}: {e}")
+
+def profile_token_weights(profile, source_weights):
+    """Weight of every token expand_profile_tokens() yields, by the field it came from (best one wins)."""
+    weights = {}
+    def add(value, source):
+        for v in value if isinstance(value, list) else [value]:
+            tok = clean_token(v)
+            if tok:
+                weights[tok] = max(weights.get(tok, 0.0), source_weights[source])
+    for field, source in (("first_name", "name"), ("last_name", "name"), ("partner", "partner"),
+                          ("pet", "pet"), ("company", "company"), ("nicknames", "nickname"),
+                          ("keywords", "keyword"), ("years", "year")):
+        if profile.get(field):
+            add(profile.get(field), source)
+    email = profile.get("email")
+    if email:
+        add(email.split("@", 1)[0], "email")
+    fn = clean_token(profile.get("first_name", "") or "")
+    ln = clean_token(profile.get("last_name", "") or "")
+    if fn and ln:
+        add([fn + ln, fn + "." + ln, fn[0] + ln, fn + ln[0]], "name")
+    return weights
+
+def iter_ranked_product(slot_weights, factor=1.0, distinct=None):
+    """
+    Lazy k-best walk over a cartesian product: yields (score, picks) in descending
+    score = factor * prod(slot_weights[i][picks[i]]), never holding more than the
+    frontier. Each slot is sorted once; a tuple's successors bump one coordinate
+    at or after its last bumped one, so every tuple is reached exactly once and a
+    child never outscores its parent. Zero weights are left out;
+    distinct=(i, j) skips tuples picking the same index in slots i and j.
+    """
+    orders = [sorted((k for k, w in enumerate(ws) if w > 0), key=lambda k, ws=ws: -ws[k]) for ws in slot_weights]
+    if not orders or not all(orders) or factor <= 0:
+        return
+    sorted_w = [[ws[k] for k in order] for ws, order in zip(slot_weights, orders)]
+    n = len(orders)
+    def score(pos):
+        s = factor
+        for i in range(n):
+            s *= sorted_w[i][pos[i]]
+        return s
+    start = (0,) * n
+    frontier = [(-score(start), start, 0)]
+    while frontier:
+        neg, pos, last = heapq.heappop(frontier)
+        for i in range(last, n):
+            if pos[i] + 1 < len(orders[i]):
+                nxt = pos[:i] + (pos[i] + 1,) + pos[i + 1:]
+                heapq.heappush(frontier, (-score(nxt), nxt, i))
+        picks = tuple(order[p] for order, p in zip(orders, pos))
+        if distinct and picks[distinct[0]] == picks[distinct[1]]:
+            continue
+        yield -neg, picks
+
+def iter_ranked_candidates(rules, token_weights, weights, use_leet=True, symbol_lanes=((1.0, None),), policy=None):
+    """
+    Every rule x transform (plain, leet) x symbol lane as one best-first stream,
+    merged into (score, candidate) pairs in descending score. symbol_lanes holds
+    (weight, SymbolInjector or None for no symbols); all variants an injector
+    makes of a candidate share that candidate's score times the lane weight.
+    Candidates are normalised with clean_token before leet / symbols are applied.
+    With a policy each lane only walks the rule slots that can meet its length
+    bounds (less the lane's symbols), banned characters and digit requirement.
+    """
+    source, transform = weights["source"], weights["transform"]
+    def item_weight(kind, value):
+        if kind == "token":
+            return token_weights.get(value, source["keyword"])
+        if kind in ("year", "phone"):
+            return source[kind]
+        return 1.0 if value == "" else transform[kind]
+
+    def rule_stream(rule, factor, change, injector):
+        slot_weights = [[item_weight(kind, v) for v in slot] for kind, slot in zip(rule.kinds, rule.slots)]
+        if rule.kinds.count("token") > 1:
+            factor *= transform["pair"]
+        for score, picks in iter_ranked_product(slot_weights, factor, rule.distinct):
+            cand = clean_token(rule.template.format(*(slot[p] for slot, p in zip(rule.slots, picks))))
+            if change is not None:
+                cand = change(cand)
+                if not cand:
+                    continue
+            if injector is None:
+                yield score, cand
+            else:
+                for v in injector.variants(cand):
+                    yield score, v
+
+    lanes = [(1.0, None)]
+    if use_leet and transform["leet"] > 0:
+        lanes.append((transform["leet"], leet_variants))
+    def lane_rules(change, injector):
+        # the rules as this lane enumerates them (None = nothing left after pruning)
+        if policy is None:
+            return rules
+        slack = injector.max_symbols if injector is not None else 0
+        # leet adds digits and replaces letters, so it keeps digit-free rules and banned letters
+        return [policy.prune_rule(rule, slack, need_digit=change is None and "digit" in policy.require,
+                                  check_banned=change is None) for rule in rules]
+
+    combos = [(lane_w * sym_w, change, injector, lane_rules(change, injector))
+              for lane_w, change in lanes for sym_w, injector in symbol_lanes if sym_w > 0]
+    streams = [rule_stream(lane[i], w, change, injector)
+               for i in range(len(rules)) for w, change, injector, lane in combos if lane[i]]
+    return heapq.merge(*streams, key=lambda sc: sc[0], reverse=True)
+
+def iter_ranked_wordlist(profile, use_leet=True, use_symbols=False, max_symbols=2,
+                         target_count=5000, random_seed=None, symbol_prob_weights=None,
+                         dedup="set", rule_config=None, symbol_mode="auto", stats=None, cache=None,
+                         score_weights=None, policy=None, exclude=None, cancel=None):
+    """
+    Best-first counterpart of iter_final_wordlist: the base rules, their leet
+    variants and their symbol variants are enumerated in descending likelihood
+    (see SCORE_GROUPS, overridden by score_weights), so the first N words are the
+    N most likely under the model. Symbol-count weights come from
+    score_weights["symbols"], else symbol_prob_weights, else RANKED_SYMBOL_DECAY ** k.
+    Pairs of whole base words are not scored; once the ranked lanes run dry they
+    follow as a "pairs" stage in the shuffle order's uniform random walk (no
+    symbols; "." and "_" joins normalise to the same words), so a target the
+    profile can reach is reached. Pairs of tokens are scored, through the pair rules.
+    A PasswordPolicy prunes each lane's rules and filters / case-transforms the
+    words (all case variants of a word share its score).
+    Words in exclude and cancel work as in iter_final_wordlist.
+    """
+    weights = merge_score_weights(score_weights)
+    rng = random.Random(random_seed or random.randint(1, 1_000_000_000))
+    if cache is not None:
+        tokens = cache.fetch(cache_key("tokens", profile_cache_key(profile)),
+                             lambda: expand_profile_tokens(profile))
+    else:
+        tokens = expand_profile_tokens(profile)
+    table = compile_base_rules(tokens, birth_years=profile_years(profile), phones=profile_phones(profile),
+                               use_separators=True, **(rule_config or {}))
+    rules = table.rules
+    lanes = [(1.0, None)]
+    if use_symbols and max_symbols > 0:
+        sym_w = weights["symbols"] or symbol_prob_weights or [RANKED_SYMBOL_DECAY ** k for k in range(max_symbols + 1)]
+        sym_w = (list(sym_w) + [0.0] * max_symbols)[:max_symbols + 1]
+        top = max(sym_w) or 1.0
+        symbol_chars = [c for c in SYMBOL_CHARS if policy is None or c not in policy.banned]
+        # one injector per symbol count, each producing exactly k symbols
+        lanes = [(sym_w[0] / top, None)]
+        if symbol_chars:
+            lanes += [(sym_w[k] / top, SymbolInjector(k, symbol_chars, rng, [0.0] * k + [1.0],
+                                                      mode=symbol_mode, tail_first=True))
+                      for k in range(1, max_symbols + 1)]
+    if policy is not None and policy.needs_symbol:
+        lanes = [(w, injector) for w, injector in lanes if injector is not None]
+    token_weights = profile_token_weights(profile, weights["source"])
+    ranked = iter_ranked_candidates(rules, token_weights, weights, use_leet, lanes, policy)
+
+    def pair_words():
+        # as stage_pairs of iter_final_wordlist, unsharded
+        tokens = table
+        lengths = None
+        if len(table) <= PAIR_LIST_MAX:
+            tokens = list(table)
+            if policy is not None:
+                tokens = policy.prune_pair_list(tokens)
+                lengths = (policy.min_len, policy.max_len)
+        return iter_token_pairs(tokens, [""], rng, lengths=lengths)
+
+    symbol_set = frozenset(SYMBOL_CHARS)
+    stages = [("ranked", (cand for score, cand in ranked), lambda c: clean_token(c, keep=symbol_set)),
+              ("pairs", _lazy(pair_words), clean_token)]
+    stats = stats if stats is not None else GenerationStats()
+    stats.start(target_count)
+    own_dedup = isinstance(dedup, str)
+    seen = make_dedup(dedup, capacity=target_count) if own_dedup else dedup
+    emitted = 0
+    st = None
+    clock = time.perf_counter
+    try:
+        for name, candidates, normalize in stages:
+            st = stats.begin(name)
+            if name == "pairs" and policy is not None and policy.needs_symbol:
+                st.exit = "policy"   # a pair has no symbols
+                break
+            t = clock()
+            for cand in candidates:
+                st.proposed += 1
+                if cancel is not None and not st.proposed % CANCEL_CHECK_EVERY and cancel.is_set():
+                    st.exit = "cancelled"
+                    break
+                cc = normalize(cand)
+                if not cc:
+                    st.empty += 1
+                    continue
+                words = (cc,) if policy is None else policy.variants(cc)
+                if not words:
+                    st.rejected += 1
+                    continue
+                # counters are per candidate, like proposed: a duplicate is a candidate
+                # none of whose case variants was new
+                fresh = [w for w in words if seen.add(w)]
+                if not fresh:
+                    st.duplicates += 1
+                    continue
+                if exclude is not None:
+                    words = [w for w in fresh if w not in exclude]
+                    if not words:
+                        st.excluded += 1
+                        continue
+                    fresh = words
+                stop = False
+                for w in fresh:
+                    emitted += 1
+                    st.accepted += 1
+                    st.seconds += clock() - t
+                    yield w
+                    t = clock()
+                    if target_count and emitted >= target_count:
+                        stop = True
+                        break
+                if stop:
+                    st.exit = "target"
+                    break
+            else:
+                st.exit = "exhausted"
+            st.seconds += clock() - t
+            if st.exit != "exhausted":
+                break
+    except GeneratorExit:
+        if st is not None:
+            st.exit = st.exit or "closed"
+        raise
+    finally:
+        stats.finish()
+        if own_dedup:
+            seen.close()
+
+# -------------------------
+# FINAL WORDLIST GENERATOR
+# -------------------------
+STAGES = ("base", "leet", "pairs", "phone", "symbols", "extras")
+PAIR_SEED_CAP = 20000    # accepted pairs kept as symbol-stage seeds
+CHECKPOINT_VERSION = 1
+CHECKPOINT_EVERY = 100_000
+CANCEL_CHECK_EVERY = 1024   # candidates between looks at the cancel event (stages can go long without a new word)
+
+def profile_phones(profile):
+    phones = []
+    if profile.get("phone"):
+        mainp = digit_only(profile.get("phone"))
+        if mainp:
+            phones.append(mainp)
+    for pn in profile.get("add_numbers", []) or []:
+        pcd = digit_only(pn)
+        if pcd:
+            phones.append(pcd)
+    return sorted(set(phones))
+
+def profile_years(profile):
+    return list(sorted(set([y for y in profile.get("years", []) if str(y).strip().isdigit()] + years_from_age(profile.get("age")))))
+
+def dump_rng_state(state):
+    return None if state is None else [state[0], list(state[1]), state[2]]
+
+def load_rng_state(state):
+    return (state[0], tuple(state[1]), state[2])
+
+def seed_ranges(accepted):
+    # output positions of the symbol seeds: base + leet, the first PAIR_SEED_CAP pairs, phone
+    b = accepted.get("base", 0) + accepted.get("leet", 0)
+    p = accepted.get("pairs", 0)
+    return [(0, b), (b, b + min(p, PAIR_SEED_CAP)), (b + p, b + p + accepted.get("phone", 0))]
+
+class Checkpoint:
+    """
+    Resume point of an iter_final_wordlist run. Passed as checkpoint=..., state()
+    returns (between two words) a JSON-able dict: seed, options fingerprint, words
+    emitted, running stage with its position and rng state, accepted words per stage.
+    A Checkpoint built from such a state (Checkpoint.load) makes the next run pick up
+    exactly there: the earlier run's words, passed as resume_words, refill the dedup
+    and the symbol seeds, and only words never emitted before follow.
+    """
+    def __init__(self, state=None):
+        self.resume_state = state
+        self._snapshot = None
+
+    def bind(self, snapshot):
+        self._snapshot = snapshot
+
+    def state(self):
+        return self._snapshot() if self._snapshot is not None else self.resume_state
+
+    def save(self, path, **extra):
+        # written next to path and renamed over it, so a crash keeps the previous checkpoint
+        state = dict(self.state(), **extra)
+        d = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=d, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(state, fh)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+        return state
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path}: not a CUPP-X checkpoint (version {CHECKPOINT_VERSION})")
+        return cls(state)
+
+def iter_final_wordlist(profile, use_leet=True, use_symbols=False, max_symbols=2,
+                        target_count=5000, random_seed=None, symbol_prob_weights=None,
+                        dedup="set", rule_config=None, symbol_mode="auto",
+                        shard=None, plan_target=None, stats=None, cache=None,
+                        checkpoint=None, resume_words=(), order="shuffle", score_weights=None, policy=None,
+                        leet_budget=0, exclude=None, cancel=None):
+    """
+    Streaming version of the generator: yields unique candidates stage by stage
+    (base, leet, pairs, phone, symbols, extras) and stops as soon as
+    target_count words have been yielded (0/None = no limit).
+    Only the dedup structure and the symbol-stage seeds are kept in memory, so the
+    output itself can go straight to a sink (see write_wordlist).
+    dedup is a mode name from DEDUP_MODES or a backend object with add(word);
+    a backend built here from a name is closed when the generator finishes.
+    rule_config may override the prefixes/suffixes/separators of the base rules.
+    symbol_mode is "auto", "sample" or "exhaustive" (see SymbolInjector); symbol
+    candidates keep their injected symbols when normalised.
+    shard=(index, count) restricts every stage to one interleaved slice of its
+    (shared, seed-derived) order, see iter_parallel_wordlist; plan_target is the
+    target used to share out open-ended stages (defaults to target_count).
+    stats, a GenerationStats, receives per-stage counters, timings and exit reasons.
+    cache, a StageCache, supplies the expanded tokens and the listed base table when
+    an earlier run had the same profile and rule_config (output is unchanged).
+    checkpoint, a Checkpoint, can be asked for the resume state at any time; if it
+    holds a state the run resumes from it (same profile/options, seed taken from it),
+    resume_words being the words emitted up to that state. target_count then
+    includes those earlier words. Not available for sharded runs.
+    order="ranked" hands over to iter_ranked_wordlist (most likely words first,
+    weighted by score_weights); checkpoints and shards need the default "shuffle".
+    policy, a PasswordPolicy, restricts the output to words that meet it: rule slots,
+    pair lists and symbol seeds that cannot produce such a word are pruned up front,
+    every normalised candidate goes through the policy's case transforms and stages
+    whose words can never qualify (e.g. no symbols outside the symbol stage) only
+    collect symbol seeds. Not combinable with checkpoints.
+    leet_budget > 0 makes the leet stage emit up to that many partial leet forms
+    (iter_partial_leet) of every distinct base word instead of one fully
+    substituted form; shuffle order only.
+    exclude (an Exclusions / ExclusionIndex, or any container) drops the new words
+    it holds right after the dedup, so they never count toward target_count; they
+    are not symbol seeds either.
+    cancel (a threading.Event) is looked at every CANCEL_CHECK_EVERY candidates,
+    new or not, and ends the run (exit "cancelled") once set.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"unknown order {order!r} (expected one of {', '.join(ORDERS)})")
+    if leet_budget < 0:
+        raise ValueError("leet_budget must be >= 0")
+    if order == "ranked":
+        if shard is not None or checkpoint is not None or leet_budget:
+            raise ValueError("ranked order does not support shards, checkpoints or partial leet")
+        yield from iter_ranked_wordlist(profile, use_leet=use_leet, use_symbols=use_symbols, max_symbols=max_symbols,
+                                        target_count=target_count, random_seed=random_seed,
+                                        symbol_prob_weights=symbol_prob_weights, dedup=dedup,
+                                        rule_config=rule_config, symbol_mode=symbol_mode, stats=stats,
+                                        cache=cache, score_weights=score_weights, policy=policy,
+                                        exclude=exclude, cancel=cancel)
+        return
+    if policy is not None and checkpoint is not None:
+        raise ValueError("checkpoints are not supported together with a password policy")
+    resume = checkpoint.resume_state if checkpoint is not None else None
+    if resume is not None:
+        if shard is not None:
+            raise ValueError("checkpoints are not supported for sharded runs")
+        random_seed = random_seed or resume["seed"]
+    random_seed = random_seed or random.randint(1, 1_000_000_000)
+    fingerprint = cache_key("run", profile_cache_key(profile), use_leet, use_symbols, max_symbols,
+                            symbol_prob_weights, rule_config or {}, symbol_mode, random_seed, leet_budget)
+    if resume is not None and resume["fingerprint"] != fingerprint:
+        raise ValueError("checkpoint was made with a different profile, seed or generation options")
+    rng = random.Random(random_seed)
+    shard_index, shard_count = shard or (0, 1)
+    # rng drives the permutations every shard must agree on; per-shard randomness
+    # (symbol sampling) comes from shard_rng, derived from the master seed
+    shard_rng = rng if shard is None else random.Random(f"{random_seed}/{shard_index}/{shard_count}")
+    plan = target_count if plan_target is None else plan_target
+
+    if cache is not None:
+        tokens = cache.fetch(cache_key("tokens", profile_cache_key(profile)),
+                             lambda: expand_profile_tokens(profile))
+    else:
+        tokens = expand_profile_tokens(profile)
+    phones = profile_phones(profile)
+    years = profile_years(profile)
+    # base seeds are enumerated straight from the rule table in a pseudo-random
+    # order; no intermediate set, no sort, no shuffle of a materialised list
+    table = compile_base_rules(tokens, birth_years=years, phones=phones, use_separators=True,
+                               **(rule_config or {}))
+    listable = len(table) <= PAIR_LIST_MAX
+    table_key = cache_key("base_table", tokens, years, phones, rule_config or {}) if cache is not None else None
+    # a listed table from an earlier run indexes much faster than the rule table
+    listed = cache.get(table_key) if cache is not None and listable else None
+    if policy is None:
+        order = leet_order = PermutedView(listed or table, IndexPermutation(len(table), rng))
+    else:
+        # only rule slots that can still give a word of allowed length (and, for the
+        # base stage, a required digit) are enumerated; leet adds digits and replaces
+        # letters, so its view keeps banned letters and digit-free rules
+        base_table = policy.prune_table(table)
+        order = PermutedView(base_table, IndexPermutation(len(base_table), rng))
+        leet_table = policy.prune_table(table, need_digit=False, check_banned=False)
+        leet_order = PermutedView(leet_table, IndexPermutation(len(leet_table), rng))
+    leet_subs = LEET_SUBSTITUTES
+    if policy is not None and policy.banned:
+        leet_subs = {ch: "".join(c for c in subs if c not in policy.banned) for ch, subs in LEET_SUBSTITUTES.items()}
+    leet_symbols = frozenset(c for subs in leet_subs.values() for c in subs if c in LEET_SYMBOLS)
+    # stages whose words cannot meet the policy still run, for symbol seeds only
+    emits = {name: policy is None or not policy.needs_symbol or name == "symbols"
+             or (name == "leet" and bool(leet_budget and leet_symbols)) for name in STAGES}
+
+    # the pair stages index base seeds at random; a list indexes ~100x faster than
+    # the rule table, so tables up to PAIR_LIST_MAX are listed once (no set, no sort)
+    pair_source = [listed] if listed else []
+    def pair_tokens():
+        if not pair_source:
+            if not listable:
+                pair_source.append(table)
+            elif cache is not None:
+                pair_source.append(cache.fetch(table_key, lambda: list(table)))
+            else:
+                pair_source.append(list(table))
+            if policy is not None and emits["pairs"] and listable:
+                pair_source[0] = policy.prune_pair_list(pair_source[0])
+        return pair_source[0]
+
+    # words accepted by stages 1-4, used as seeds for symbol injection
+    # (pair seeds are capped so the seed list stays bounded now that pairs are uncapped)
+    seeds = []
+    seed_seen = set()   # with a policy, seeds are the distinct normalised candidates
+    pair_seed_cap = PAIR_SEED_CAP
+
+    # where the run is: running stage index, resume position inside it (stage
+    # specific, see the stage functions), rng state when it started (None = the
+    # current state, nothing consumed it since) and emitted count at its start
+    at = {"stage": 0, "cursor": 0, "within": 0, "seed_rng": None, "rng": None, "start_emitted": 0}
+    def my_len(view):
+        return len(range(shard_index, len(view), shard_count))
+
+    # 1) base seeds (cursor = position in this shard's slice of the order)
+    def stage_base(start):
+        for k in range(start, my_len(order)):
+            at["cursor"] = k + 1
+            yield order[shard_index + k * shard_count]
+
+    # 2) leet variants (leet_budget: partial forms; cursor = source position,
+    #    within = forms of that source already taken)
+    def stage_leet(start):
+        if not use_leet:
+            return
+        if not leet_budget:
+            for k in range(start, my_len(leet_order)):
+                at["cursor"] = k + 1
+                lv = leet_variants(leet_order[shard_index + k * shard_count])
+                if lv:
+                    yield lv
+            return
+        # source words are deduplicated here so no word's forms are walked twice;
+        # forms of different words can coincide and are left to the shared dedup
+        sources = {clean_token(leet_order[shard_index + k * shard_count]) for k in range(start)}
+        skip = resume["within"] if resume is not None and resume["stage"] == STAGES.index("leet") else 0
+        for k in range(start, my_len(leet_order)):
+            word = clean_token(leet_order[shard_index + k * shard_count])
+            if not word or word in sources:
+                continue
+            sources.add(word)
+            at["cursor"], at["within"] = k, 0
+            for within, form in enumerate(iter_partial_leet(word, leet_budget, leet_subs), 1):
+                if within <= skip:
+                    continue
+                at["within"] = within
+                yield form
+            skip = 0
+
+    # 3) combine pairs (uniform random walk over every ordered pair; the pair
+    #    index is already permuted, so the unshuffled base seeds are used)
+    def stage_pairs(start, separators=("",)):
+        tokens = pair_tokens()
+        lengths = None
+        if policy is not None and isinstance(tokens, list):
+            # emitting stages walk only pairs of allowed length; seed-only ones
+            # those that are still allowed once 1..max_symbols symbols go in
+            lengths = (policy.min_len, policy.max_len) if emits["pairs"] else \
+                (policy.min_len - max_symbols, max(policy.max_len - 1, 1) if policy.max_len else 0)
+        pairs = iter_token_pairs(tokens, list(separators), rng, shard_index + start * shard_count, shard_count,
+                                 lengths=lengths)
+        for k, w in enumerate(pairs, start + 1):
+            at["cursor"] = k
+            yield w
+
+    # 4) phone derived
+    def stage_phone(start):
+        if shard_index:
+            return
+        items = [v for p in phones for v in (p, p[-4:])]
+        for k in range(start, len(items)):
+            at["cursor"] = k + 1
+            yield items[k]
+
+    # 5) symbol injection (probabilistic, or exhaustive for small spaces);
+    #    cursor = seed position, within = variants of that seed already taken
+    def stage_symbols(start):
+        if not use_symbols:
+            return
+        symbol_chars, weights, seed_list = SYMBOL_CHARS, symbol_prob_weights, seeds[:]
+        if policy is not None:
+            symbol_chars = [c for c in SYMBOL_CHARS if c not in policy.banned]
+            if policy.needs_symbol:
+                # a variant without symbols can never qualify
+                weights = list(weights or [1.0] * (max_symbols + 1))
+                weights[0] = 0.0
+                if sum(weights) <= 0:
+                    return
+            fewest = 1 if policy.needs_symbol else 0
+            seed_list = [s for s in seed_list if policy.range_ok(len(s) + fewest, len(s) + max_symbols)]
+            if not symbol_chars:
+                return
+        injector = SymbolInjector(max_symbols, symbol_chars, shard_rng, weights, mode=symbol_mode)
+        shard_rng.shuffle(seed_list)
+        skip = 0
+        if resume is not None and resume["stage"] == STAGES.index("symbols") and resume["seed_rng"]:
+            skip = resume["within"]
+            shard_rng.setstate(load_rng_state(resume["seed_rng"]))
+        for j in range(start, len(seed_list)):
+            seed = seed_list[j]
+            at["cursor"], at["within"], at["seed_rng"] = j, 0, shard_rng.getstate()
+            variants = injector.variants(seed)
+            # also apply leet + symbols occasionally
+            lv = leet_variants(seed) if use_leet else ""
+            if lv:
+                variants = itertools.chain(variants, _lazy(injector.variants, lv))
+            for within, v in enumerate(variants, 1):
+                if within <= skip:
+                    continue
+                at["within"] = within
+                yield v
+            skip = 0
+
+    symbol_set = frozenset(SYMBOL_CHARS)
+    def clean_with_symbols(c):
+        return clean_token(c, keep=symbol_set)
+
+    def clean_with_leet_symbols(c):
+        return clean_token(c, keep=leet_symbols)
+
+    # 6) extras: "." and "_" are stripped by clean_token, so these are the pair
+    #    stage's words again; only worth walking when that stage stopped early
+    def stage_extras(start):
+        return stage_pairs(start, separators=(".", "_"))
+
+    stages = [("base", stage_base, clean_token), ("leet", stage_leet, clean_with_leet_symbols if leet_budget else clean_token),
+              ("pairs", stage_pairs, clean_token), ("phone", stage_phone, clean_token),
+              ("symbols", stage_symbols, clean_with_symbols), ("extras", stage_extras, clean_token)]
+
+    disabled = {"leet": not use_leet, "symbols": not use_symbols}
+    stats = stats if stats is not None else GenerationStats()
+    stats.start(target_count)
+    own_dedup = isinstance(dedup, str)
+    seen = make_dedup(dedup, capacity=target_count) if own_dedup else dedup
+    emitted = 0
+    prior_accepted = {}
+    if resume is not None:
+        # replay the earlier output: it fills the dedup and the symbol seeds
+        prior_accepted = resume["accepted"]
+        seed_spans = seed_ranges(prior_accepted)
+        for w in resume_words:
+            if not seen.add(w):
+                continue
+            if any(lo <= emitted < hi for lo, hi in seed_spans):
+                seeds.append(w)
+            emitted += 1
+        if emitted != resume["emitted"]:
+            if own_dedup:
+                seen.close()
+            raise ValueError(f"checkpoint expects {resume['emitted']} earlier words, got {emitted}")
+        pair_seed_cap = max(0, PAIR_SEED_CAP - prior_accepted.get("pairs", 0))
+        at.update(stage=resume["stage"], cursor=resume["cursor"], within=resume["within"],
+                  start_emitted=resume["start_emitted"])
+
+    def snapshot():
+        return {"version": CHECKPOINT_VERSION, "fingerprint": fingerprint, "seed": random_seed,
+                "emitted": emitted, "stage": at["stage"], "cursor": at["cursor"], "within": at["within"],
+                "seed_rng": dump_rng_state(at["seed_rng"]), "rng": dump_rng_state(at["rng"] or rng.getstate()), "start_emitted": at["start_emitted"],
+                "accepted": {n: prior_accepted.get(n, 0) + (stats.stages[n].accepted if n in stats.stages else 0)
+                             for n in STAGES}}
+    if checkpoint is not None:
+        checkpoint.bind(snapshot)
+
+    st = None
+    pairs_walked = False   # the pair stage went through its whole space
+    clock = time.perf_counter
+    try:
+        for idx, (name, stage, normalize) in enumerate(stages):
+            if idx < at["stage"]:
+                continue   # finished by the run this one resumes
+            st = stats.begin(name)
+            if target_count and emitted >= target_count:
+                st.exit = "skipped"
+                continue
+            if disabled.get(name):
+                st.exit = "disabled"
+                at.update(stage=idx + 1, cursor=0, within=0, seed_rng=None, rng=None)
+                continue
+            if name == "extras" and pairs_walked:
+                st.exit = "exhausted"   # every pair is in the dedup already
+                at.update(stage=idx + 1, cursor=0, within=0, seed_rng=None, rng=None)
+                continue
+            start = 0
+            if resume is not None and idx == resume["stage"]:
+                rng.setstate(load_rng_state(resume["rng"]))
+                start = at["cursor"]
+            else:
+                at["start_emitted"] = emitted
+            at.update(stage=idx, cursor=start, rng=rng.getstate())
+            keep_seed = name in ("base", "leet", "pairs", "phone")
+            emit = emits[name]
+            if not emit and not (keep_seed and use_symbols):
+                st.exit = "policy"
+                at.update(stage=idx + 1, cursor=0, within=0, seed_rng=None, rng=None)
+                continue
+            # the pair space is open-ended: leave room for the symbol stage
+            stage_limit = target_count
+            if name == "pairs" and use_symbols and plan:
+                begun = at["start_emitted"]
+                stage_limit = begun + max(1, int((plan - begun) * PAIR_SHARE_WITH_SYMBOLS))
+            t = clock()
+            for cand in stage(start):
+                st.proposed += 1
+                if cancel is not None and not st.proposed % CANCEL_CHECK_EVERY and cancel.is_set():
+                    st.exit = "cancelled"
+                    break
+                cc = normalize(cand)
+                if not cc:
+                    st.empty += 1
+                    continue
+                if policy is None:
+                    if not seen.add(cc):
+                        st.duplicates += 1
+                        continue
+                    if exclude is not None and cc in exclude:
+                        st.excluded += 1
+                        continue
+                    if keep_seed and (name != "pairs" or pair_seed_cap > 0):
+                        seeds.append(cc)
+                        if name == "pairs":
+                            pair_seed_cap -= 1
+                    words = (cc,)
+                else:
+                    words = policy.variants(cc) if emit else ()
+                    if words:
+                        # per candidate, like proposed: a duplicate (or excluded) candidate
+                        # is one none of whose case variants is new (or unlisted)
+                        fresh = [w for w in words if seen.add(w)]
+                        if not fresh:
+                            st.duplicates += 1
+                            continue
+                        words = fresh
+                        if exclude is not None:
+                            words = [w for w in fresh if w not in exclude]
+                            if not words:
+                                st.excluded += 1
+                                continue
+                    elif exclude is not None and cc in exclude:
+                        # not emitted (policy rejected it, or a seed-only stage), but
+                        # excluded words are no symbol seeds either
+                        if emit:
+                            st.rejected += 1
+                        continue
+                    # words the policy rejects still seed: symbols can make them qualify
+                    if keep_seed and (name != "pairs" or pair_seed_cap > 0) and cc not in seed_seen:
+                        seed_seen.add(cc)
+                        seeds.append(cc)
+                        if name == "pairs":
+                            pair_seed_cap -= 1
+                    if not emit:
+                        if name == "pairs" and not pair_seed_cap:
+                            st.exit = "seeds"
+                            break
+                        continue
+                    if not words:
+                        st.rejected += 1
+                        continue
+                stop = None
+                for w in words:
+                    emitted += 1
+                    st.accepted += 1
+                    st.seconds += clock() - t
+                    yield w
+                    t = clock()
+                    if target_count and emitted >= target_count:
+                        stop = "target"
+                        break
+                    if stage_limit and emitted >= stage_limit:
+                        stop = "share"
+                        break
+                if stop:
+                    st.exit = stop
+                    break
+            else:
+                st.exit = "exhausted"
+            if st.exit == "cancelled":
+                st.seconds += clock() - t
+                break
+            pairs_walked = pairs_walked or (name == "pairs" and st.exit == "exhausted")
+            if st.exit != "target":
+                at.update(stage=idx + 1, cursor=0, within=0, seed_rng=None, rng=None)
+            st.seconds += clock() - t
+    except GeneratorExit:
+        if st is not None and st.exit is None:
+            st.exit = "closed"
+        raise
+    finally:
+        stats.finish()
+        if own_dedup:
+            seen.close()
+
+def _lazy(fn, *args):
+    # defer fn(*args) until the first item is wanted (keeps rng use in stream order)
+    yield from fn(*args)
+
+def generate_final_wordlist(profile, use_leet=True, use_symbols=False, max_symbols=2,
+                            target_count=5000, random_seed=None, symbol_prob_weights=None,
+                            dedup="set", rule_config=None, symbol_mode="auto", workers=1, cache=None,
+                            order="shuffle", score_weights=None, policy=None, leet_budget=0, exclude=None):
+    kwargs = dict(use_leet=use_leet, use_symbols=use_symbols, max_symbols=max_symbols,
+                  target_count=target_count, random_seed=random_seed,
+                  symbol_prob_weights=symbol_prob_weights, dedup=dedup,
+                  rule_config=rule_config, symbol_mode=symbol_mode, cache=cache,
+                  order=order, score_weights=score_weights, policy=policy, leet_budget=leet_budget,
+                  exclude=exclude)
+    if workers and workers > 1 and order == "shuffle":   # ranked order is one best-first walk
+        return list(iter_parallel_wordlist(profile, workers=workers, **kwargs))
+    return list(iter_final_wordlist(profile, **kwargs))
+
+# -------------------------
+# KEYSPACE ESTIMATE
+# -------------------------
+# rough cost of one proposed candidate per stage in one process (microseconds,
+# normalising and dedup included), from bench_cuppx.py runs on a ~3 GHz core
+ESTIMATE_COST_US = {"base": 24, "leet": 22, "pairs": 22, "phone": 5, "symbols": 31, "extras": 22, "ranked": 20}
+# resident bytes per accepted word for each dedup backend (see the README table)
+ESTIMATE_DEDUP_BYTES = {"set": 110, "hash": 16, "bloom": 2, "spill": 0}
+ESTIMATE_SPILL_BUFFER = 70 << 20
+ESTIMATE_ITEM_BYTES = 80   # one short str in a list (symbol seeds, the listed base table)
+ESTIMATE_SPACE_CAP = 10 ** 15   # per-word symbol spaces are capped here, far past any walk, so floats never overflow
+ESTIMATE_CONFIRM_SECONDS = 60          # the GUI asks before runs expected to take longer ...
+ESTIMATE_CONFIRM_BYTES = 1 << 30       # ... or to need more memory than this
+
+def _value_key(v):
+    # what the estimate tracks of a normalised string: length, has a digit, has a letter
+    return (len(v), any(ch.isdigit() for ch in v), any(ch.isalpha() for ch in v))
+
+def _convolve(a, b):
+    """Histogram of concatenations x + y, x from histogram a, y from histogram b."""
+    out = {}
+    for (la, da, aa), ca in a.items():
+        for (lb, db, ab), cb in b.items():
+            k = (la + lb, da or db, aa or ab)
+            out[k] = out.get(k, 0) + ca * cb
+    return out
+
+def _add_hist(into, h, factor=1):
+    for k, c in h.items():
+        into[k] = into.get(k, 0) + c * factor
+    return into
+
+class _Box:
+    """
+    The normalised words of one rule (or a part of it): the cartesian product of
+    slot value sets, minus tuples repeating a value at the distinct positions
+    (entries (i, j, repeated): values in repeated come from several table values,
+    e.g. "john.doe" and "johndoe", so they may still pair with themselves).
+    weight is how many base table entries give each of its words (e.g. every
+    separator normalises to "", so "john.1994" and "john_1994" are one word).
+    """
+    __slots__ = ("sets", "distinct", "weight")
+
+    def __init__(self, sets, distinct=frozenset(), weight=1.0):
+        self.sets = sets
+        self.distinct = distinct
+        self.weight = weight
+
+def rule_boxes(rule, banned=frozenset()):
+    """
+    Split a Rule into _Boxes of non-empty normalised slot values: a slot whose
+    values normalise to "" (a separator, the empty prefix) is dropped from one
+    copy and kept, without "", in the other. Values holding a banned character go.
+    """
+    options = []
+    repeated = frozenset()
+    for slot in rule.slots:
+        counts = {}
+        for v in slot:
+            c = clean_token(v)
+            if banned.isdisjoint(c):
+                counts[c] = counts.get(c, 0) + 1
+        repeated |= frozenset(c for c, n in counts.items() if n > 1)
+        empty = counts.pop("", 0)
+        opts = [(None, empty)] if empty else []
+        if counts:
+            opts.append((frozenset(counts), sum(counts.values()) / len(counts)))
+        options.append(opts)
+    # slots in the order the template writes them ("{1}{0}" puts the phone first);
+    # literal text is a slot with one value
+    layout = []
+    for literal, field, _, _ in string.Formatter().parse(rule.template):
+        if clean_token(literal):
+            layout.append(len(options))
+            options.append([(frozenset([clean_token(literal)]), 1.0)])
+        if field is not None:
+            layout.append(int(field))
+    boxes = []
+    for combo in itertools.product(*options):
+        kept = [i for i in layout if combo[i][0] is not None]
+        if not kept:
+            continue
+        weight = 1.0
+        for _, w in combo:
+            weight *= w
+        distinct = frozenset()
+        if rule.distinct and all(i in kept for i in rule.distinct):
+            distinct = frozenset([tuple(sorted(kept.index(i) for i in rule.distinct)) + (repeated,)])
+        boxes.append(_Box(tuple(combo[i][0] for i in kept), distinct, weight))
+    return boxes
+
+class _HistCache:
+    # slot histograms by value set; boxes share their token / suffix / year sets
+    def __init__(self):
+        self.hists = {}
+
+    def of(self, values):
+        h = self.hists.get(values)
+        if h is None:
+            h = {}
+            for v in values:
+                k = _value_key(v)
+                h[k] = h.get(k, 0) + 1
+            self.hists[values] = h
+        return h
+
+    def box(self, sets, distinct):
+        out = {(0, False, False): 1}
+        for s in sets:
+            out = _convolve(out, self.of(s))
+        for i, j, repeated in distinct:
+            # tuples with the same value at i and j: one value of doubled length
+            diag = {}
+            for v in (sets[i] & sets[j]) - repeated:
+                n, d, a = _value_key(v)
+                diag[(2 * n, d, a)] = diag.get((2 * n, d, a), 0) + 1
+            for p, s in enumerate(sets):
+                if p not in (i, j):
+                    diag = _convolve(diag, self.of(s))
+            _add_hist(out, diag, -1)
+        return {k: c for k, c in out.items() if c}
+
+def union_of_boxes(boxes, hists=None):
+    """
+    (histogram, multiplicities) of the distinct words of several boxes.
+    Boxes with the same number of slots overlap slot by slot, so their union is
+    exact by inclusion-exclusion over the box intersections (each one a box);
+    a word split differently by two rules ("johndoe" + "1" vs "john" + "doe1")
+    is counted twice, which keeps the result an upper bound (within about 1% on
+    real profiles). multiplicities maps table entries per word -> words, the
+    weights of the boxes a word is in being summed.
+    """
+    hists = hists or _HistCache()
+    merged = {}
+    for b in boxes:
+        key = (b.sets, b.distinct)
+        if key in merged:
+            merged[key].weight += b.weight
+        else:
+            merged[key] = _Box(b.sets, b.distinct, b.weight)
+    groups = {}
+    for b in merged.values():
+        groups.setdefault(len(b.sets), []).append(b)
+    total, mult = {}, {}
+    for group in groups.values():
+        inter = {}   # frozenset of box indices -> histogram of their intersection
+        stack = [(0, frozenset(), None, frozenset())]
+        while stack:
+            start, idxs, sets, distinct = stack.pop()
+            for i in range(start, len(group)):
+                b = group[i]
+                new = b.sets if sets is None else tuple(x & y for x, y in zip(sets, b.sets))
+                if not all(new):
+                    continue
+                d = distinct | b.distinct
+                h = hists.box(new, d)
+                if not h:
+                    continue
+                key = idxs | {i}
+                inter[key] = h
+                stack.append((i + 1, key, new, d))
+        sizes = {key: sum(h.values()) for key, h in inter.items()}
+        for key, h in inter.items():
+            _add_hist(total, h, 1 if len(key) % 2 else -1)
+            # words in exactly these boxes (Moebius inversion over the supersets)
+            exact = sum(n if (len(other) - len(key)) % 2 == 0 else -n
+                        for other, n in sizes.items() if key <= other)
+            if exact > 0:
+                m = round(sum(group[i].weight for i in key), 3)
+                mult[m] = mult.get(m, 0) + exact
+    return {k: c for k, c in total.items() if c > 0}, mult
+
+def map_boxes(boxes, fn):
+    """Boxes of fn applied to every slot value (fn must work character by character, like leet)."""
+    out = []
+    for b in boxes:
+        sets = tuple(frozenset(fn(v) for v in s) for s in b.sets)
+        out.append(_Box(sets, b.distinct, b.weight))
+    return out
+
+def coverage(mult, fraction, unseen=0.0, repeat=1):
+    """
+    Expected distinct words met after walking fraction of a uniformly permuted
+    space in which a word with multiplicity m occurs m * repeat times; with unseen,
+    only words an earlier walk over fraction unseen of a space of multiplicity m missed.
+    """
+    if fraction >= 1:
+        return sum(c * (1 - unseen) ** m if unseen else c for m, c in mult.items())
+    left = 1.0 - fraction
+    return sum(c * (1 - unseen) ** m * (1 - left ** (m * repeat)) for m, c in mult.items())
+
+def walk_fraction(mult, wanted, unseen=0.0, repeat=1):
+    """Smallest fraction of the space to walk (see coverage) to meet wanted distinct words."""
+    if wanted <= 0:
+        return 0.0
+    if wanted >= coverage(mult, 1.0, unseen):
+        return 1.0
+    lo, hi = 0.0, 1.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if coverage(mult, mid, unseen, repeat) < wanted:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+def policy_count(hist, policy=None, symbols=0):
+    """Words of a histogram (plus `symbols` injected symbols) that meet policy, case variants included."""
+    if policy is None:
+        return sum(hist.values())
+    total = 0
+    need = policy.require
+    for (n, digit, alpha), c in hist.items():
+        if not policy.length_ok(n + symbols):
+            continue
+        if ("digit" in need and not digit) or ("symbol" in need and not symbols):
+            continue
+        if alpha:
+            # lower has lower case only, upper upper case only, capitalize both
+            ok = sum(1 for case in policy.cases
+                     if ("lower" not in need or case != "upper") and ("upper" not in need or case != "lower"))
+        else:
+            ok = 0 if need & {"lower", "upper"} else 1
+        total += c * ok
+    return total
+
+def symbol_variant_counts(length, injector):
+    """{k: distinct variants with k symbols} of one word, as SymbolInjector.variants makes them."""
+    n = len(injector.symbol_chars)
+    spaces = {k: min(math.comb(length + k, k) * n ** k, ESTIMATE_SPACE_CAP) for k in injector.support}
+    if injector.mode == "exhaustive" or (injector.mode == "auto" and injector.space_size(length) <= injector.exhaustive_limit):
+        return spaces
+    # sample(): tries draws of k by the weights; distinct draws among them, at most 300 in all
+    out = {}
+    prev = 0.0
+    for k, cum in zip(injector.counts, injector.cum_weights):
+        draws = injector.tries * (cum - prev)
+        prev = cum
+        if k in spaces and draws > 0:
+            # 1 - (1 - 1/space) ** draws, without losing 1/space to rounding
+            hit = 1.0 if spaces[k] == 1 else -math.expm1(draws * math.log1p(-1 / spaces[k]))
+            out[k] = spaces[k] * hit
+    made = sum(out.values())
+    if made > 300:
+        out = {k: v * 300 / made for k, v in out.items()}
+    return out
+
+class StageEstimate:
+    # space: distinct words the stage can add (kind exact, bound = upper bound, estimate)
+    # supplied: words it is expected to emit for the target; proposed: candidates it walks for them
+    __slots__ = ("name", "space", "kind", "supplied", "proposed", "seconds")
+
+    def __init__(self, name, space=0, kind="exact"):
+        self.name = name
+        self.space = int(space)
+        self.kind = kind
+        self.supplied = self.proposed = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class KeyspaceEstimate:
+    """
+    What a run would do, worked out from the rule table without generating:
+    per stage the number of distinct words it can add, how many the target takes
+    from it and the candidates walked for them, plus expected time and memory.
+    See estimate_keyspace.
+    """
+    def __init__(self, target_count, workers=1):
+        self.target_count = target_count
+        self.workers = workers
+        self.stages = {}
+        self.memory = 0
+        self.estimate_seconds = 0.0
+
+    def add(self, st):
+        self.stages[st.name] = st
+        return st
+
+    @property
+    def space(self):
+        return sum(st.space for st in self.stages.values())
+
+    @property
+    def words(self):
+        return sum(st.supplied for st in self.stages.values())
+
+    @property
+    def seconds(self):
+        return sum(st.seconds for st in self.stages.values()) / max(1, self.workers)
+
+    @property
+    def short(self):
+        return bool(self.target_count) and self.words < self.target_count
+
+    @property
+    def supplier(self):
+        """The stage the last word comes from."""
+        last = None
+        for st in self.stages.values():
+            if st.supplied:
+                last = st.name
+        return last
+
+    def status_line(self):
+        return (f"~{self.words:,} unique words, ~{format_seconds(self.seconds)}, ~{format_bytes(self.memory)} RAM; "
+                f"last words from {self.supplier or '-'}")
+
+    def summary(self):
+        lines = [f"{'stage':<9}{'space':>15}  {'kind':<9}{'supplies':>12}{'proposed':>14}{'secs':>10}"]
+        for st in self.stages.values():
+            lines.append(f"{st.name:<9}{st.space:>15,}  {st.kind:<9}{st.supplied:>12,}{st.proposed:>14,}"
+                         f"{st.seconds:>10.2f}")
+        lines.append(f"expected {self.words:,} unique words"
+                     + (f" of target {self.target_count:,}" if self.target_count else "")
+                     + f" in ~{format_seconds(self.seconds)}"
+                     + (f" on {self.workers} workers" if self.workers > 1 else "")
+                     + f", ~{format_bytes(self.memory)} RAM; the last words come from {self.supplier or '-'}")
+        if self.short:
+            lines.append(f"the whole space holds ~{self.space:,} words, fewer than the target: every stage will run dry")
+        lines.append(f"(estimated in {self.estimate_seconds * 1000:.0f} ms)")
+        return "\n".join(lines)
+
+    def as_dict(self):
+        return {"target_count": self.target_count, "workers": self.workers, "space": self.space,
+                "words": self.words, "seconds": self.seconds, "memory": self.memory, "supplier": self.supplier,
+                "short": self.short, "stages": [st.as_dict() for st in self.stages.values()]}
+
+def format_seconds(s):
+    if s < 90:
+        return f"{s:.1f}s"
+    if s < 5400:
+        return f"{s / 60:.0f} min"
+    if s < 172800:
+        return f"{s / 3600:.1f} h"
+    return f"{s / 86400:.0f} days"
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def estimate_keyspace(profile, use_leet=True, use_symbols=False, max_symbols=2, target_count=5000,
+                      symbol_prob_weights=None, dedup="set", rule_config=None, symbol_mode="auto",
+                      order="shuffle", policy=None, leet_budget=0, workers=1, cache=None):
+    """
+    Size up a run of iter_final_wordlist with these options in milliseconds,
+    without generating a word: a KeyspaceEstimate with, for every stage, the
+    distinct words it can add (base, leet and pair spaces are counted from the
+    rule slots, see union_of_boxes; the symbol stage from each seed's injection
+    space, sampled spaces by the expected distinct draws), how many of them the
+    target takes in stage order (including the pair stage's share when symbols
+    are on) and how many candidates are walked for those, from the duplicate
+    structure of the table (see coverage). Time comes from ESTIMATE_COST_US,
+    memory from the dedup backend and the lists the run keeps. Exclusion
+    indexes are not taken into account (they only remove words).
+    """
+    t0 = time.perf_counter()
+    workers = max(1, workers or 1) if order == "shuffle" else 1
+    est = KeyspaceEstimate(target_count, workers)
+    if cache is not None:
+        tokens = cache.fetch(cache_key("tokens", profile_cache_key(profile)), lambda: expand_profile_tokens(profile))
+    else:
+        tokens = expand_profile_tokens(profile)
+    phones = profile_phones(profile)
+    table = compile_base_rules(tokens, birth_years=profile_years(profile), phones=phones, use_separators=True,
+                               **(rule_config or {}))
+    banned = frozenset(c.lower() for c in policy.banned) if policy is not None else frozenset()
+    hists = _HistCache()
+    boxes = [b for rule in table.rules for b in rule_boxes(rule, banned)]
+    base_hist, base_mult = union_of_boxes(boxes, hists)
+    base_words = sum(base_hist.values()) or 1
+    raw = len(table)
+
+    # leet maps letters one by one, so a box maps to a box; words with no leetable
+    # letter have no leet form (leet_variants gives None)
+    leet_hist = {}
+    if use_leet and not leet_budget:
+        leet_hist, _ = union_of_boxes(map_boxes(boxes, lambda v: v.translate(LEET_MAP)), hists)
+        plain = [_Box(tuple(frozenset(v for v in s if v.translate(LEET_MAP) == v) for s in b.sets), b.distinct, b.weight)
+                 for b in boxes]
+        plain_hist, _ = union_of_boxes([b for b in plain if all(b.sets)], hists)
+        leet_hist = {k: c - plain_hist.get(k, 0) for k, c in leet_hist.items() if c > plain_hist.get(k, 0)}
+    elif use_leet:
+        # partial leet: min(budget, forms) per distinct base word, forms from the
+        # substitutable letters of each slot value (histogram of form counts)
+        cap = leet_budget + 1
+        forms_of = {}
+        def forms(values):
+            h = forms_of.get(values)
+            if h is None:
+                h = {}
+                for v in values:
+                    f = 1
+                    for ch in v:
+                        f = min(cap, f * (1 + len(LEET_SUBSTITUTES.get(ch, ""))))
+                    h[f] = h.get(f, 0) + 1
+                forms_of[values] = h
+            return h
+        made = listed = 0
+        for b in boxes:
+            acc = {1: 1}
+            for s in b.sets:
+                nxt = {}
+                for fa, ca in acc.items():
+                    for fb, cb in forms(s).items():
+                        f = min(cap, fa * fb)
+                        nxt[f] = nxt.get(f, 0) + ca * cb
+                acc = nxt
+            made += sum(min(leet_budget, f - 1) * c for f, c in acc.items())
+            listed += sum(acc.values())
+        # overlapping boxes list some words more than once; scale to the distinct words
+        per_word = made / listed if listed else 0.0
+        leet_hist = {k: c * per_word for k, c in base_hist.items()}
+
+    # as in iter_final_wordlist: under a symbol requirement only the symbol stage
+    # (and partial leet, when its symbol substitutes are allowed) can emit
+    leet_symbols = LEET_SYMBOLS - (policy.banned if policy is not None else frozenset())
+    emits = {name: policy is None or not policy.needs_symbol or name == "symbols"
+             or (name == "leet" and bool(leet_budget and leet_symbols)) for name in STAGES}
+    remaining = target_count or float("inf")
+    emitted = 0
+    seeds = {}   # histogram of the symbol seeds (accepted words of stages 1-4)
+
+    def pair_space(emit):
+        # pairs of whole base table entries: every word of base_hist with every other
+        # (raw multiplicities multiply); extras walk the same words again with "." and
+        # "_" separators, which normalise away, so they only add pairs still unseen
+        pair_hist = _convolve(base_hist, base_hist)
+        pair_mult = {}
+        for ma, ca in base_mult.items():
+            for mb, cb in base_mult.items():
+                m = round(ma * mb, 3)
+                pair_mult[m] = pair_mult.get(m, 0) + ca * cb
+        pair_walk = raw * (raw - 1)
+        if policy is not None:
+            # only pairs of allowed length are walked (LengthBandedPairs, same bounds as stage_pairs)
+            lo, hi = (policy.min_len, policy.max_len) if emit else \
+                (policy.min_len - max_symbols, max(policy.max_len - 1, 1) if policy.max_len else 0)
+            def banded(h):
+                return {k: c for k, c in h.items() if k[0] >= lo and (not hi or k[0] <= hi)}
+            raw_hist = {}
+            for b in boxes:
+                _add_hist(raw_hist, hists.box(b.sets, b.distinct), b.weight)
+            pair_hist = banded(pair_hist)
+            pair_walk = int(sum(banded(_convolve(raw_hist, raw_hist)).values()))
+            # the band holds mostly short words, which repeat less than the average;
+            # walk it as if every pair in it repeated equally often
+            banded_words = sum(pair_hist.values())
+            pair_mult = {pair_walk / banded_words: banded_words} if banded_words else {}
+        return pair_hist, pair_mult, pair_walk
+
+    def take(name, hist, mult, walk, kind, unseen=0.0, repeat=1, words=None):
+        # one stage: space, the words the target takes, the walk that finds them
+        nonlocal remaining, emitted
+        space = policy_count(hist, policy) if emits[name] else 0
+        st = est.add(StageEstimate(name, space, kind))
+        limit = remaining
+        if name == "pairs" and use_symbols and target_count and order == "shuffle":
+            limit = min(limit, max(1, int((target_count - emitted) * PAIR_SHARE_WITH_SYMBOLS)))
+        st.supplied = int(min(limit, space))
+        total = words if words is not None else sum(hist.values())
+        if not emits[name] and not use_symbols:
+            return st   # skipped: nothing it finds could be emitted or seeded
+        if not emits[name]:
+            wanted = total if name != "pairs" else min(total, PAIR_SEED_CAP)
+        else:
+            wanted = st.supplied * (total / space) if space else 0
+        if mult is not None and total:
+            scale = total / max(1.0, coverage(mult, 1.0, unseen))
+            fraction = walk_fraction(mult, wanted / scale, unseen, repeat)
+        else:
+            fraction = min(1.0, wanted / total) if total else float(limit > 0)
+        st.proposed = int(walk * fraction)
+        st.seconds = st.proposed * ESTIMATE_COST_US[name] / 1e6
+        remaining -= st.supplied
+        emitted += st.supplied
+        if use_symbols and name != "extras":
+            seed_words = wanted if name != "pairs" else min(wanted, PAIR_SEED_CAP)
+            if total:
+                _add_hist(seeds, hist, seed_words / total)
+        return st
+
+    if order == "ranked":
+        # one best-first walk over the base rules, their leet forms and, per symbol
+        # count, their symbol variants, then whole-word pairs for what is left
+        words = _add_hist(dict(base_hist), leet_hist)
+        plain = space = policy_count(words, policy) if policy is None or not policy.needs_symbol else 0
+        if use_symbols and max_symbols > 0:
+            symbol_chars = [c for c in SYMBOL_CHARS if policy is None or c not in policy.banned]
+            for k in range(1, max_symbols + 1 if symbol_chars else 1):
+                injector = SymbolInjector(k, symbol_chars, random.Random(0), [0.0] * k + [1.0], mode=symbol_mode)
+                for key, c in words.items():
+                    space += policy_count({key: c * symbol_variant_counts(key[0], injector).get(k, 0)}, policy, k)
+        st = est.add(StageEstimate("ranked", space, "bound"))
+        st.supplied = int(min(remaining, space))
+        # plain words mostly score above their symbol variants and repeat about as
+        # often as in the base table; symbol variants rarely repeat
+        first = min(st.supplied, plain)
+        st.proposed = int(first * raw / base_words + (st.supplied - first) * 1.3)
+        st.seconds = st.proposed * ESTIMATE_COST_US["ranked"] / 1e6
+        remaining -= st.supplied
+        emitted += st.supplied
+        pairs = None
+        if remaining > 0 and (policy is None or not policy.needs_symbol):
+            pair_hist, pair_mult, pair_walk = pair_space(True)
+            pairs = take("pairs", pair_hist, pair_mult, pair_walk, "bound")
+        est.memory = emitted * ESTIMATE_DEDUP_BYTES.get(dedup, ESTIMATE_DEDUP_BYTES["set"])
+        if dedup == "spill":
+            est.memory += ESTIMATE_SPILL_BUFFER
+        if pairs is not None and pairs.proposed and raw <= PAIR_LIST_MAX:
+            est.memory += raw * ESTIMATE_ITEM_BYTES
+        est.estimate_seconds = time.perf_counter() - t0
+        return est
+
+    take("base", base_hist, base_mult, raw, "bound")
+    if use_leet:
+        leet_words = sum(leet_hist.values())
+        if leet_budget:
+            take("leet", leet_hist, None, leet_words, "estimate")
+        else:
+            take("leet", leet_hist, base_mult, raw, "bound")
+    else:
+        est.add(StageEstimate("leet"))
+
+    pair_hist, pair_mult, pair_walk = pair_space(emits["pairs"])
+    pairs = take("pairs", pair_hist, pair_mult, pair_walk, "bound")
+    walked = pairs.proposed / pair_walk if pair_walk else 1.0
+
+    base_sets = [b.sets[0] for b in boxes if len(b.sets) == 1]
+    phone_items = {v for p in phones for v in (p, p[-4:])}
+    fresh = [v for v in phone_items if not any(v in s for s in base_sets)]
+    phone_hist = {}
+    for v in fresh:
+        _add_hist(phone_hist, {_value_key(v): 1})
+    take("phone", phone_hist, None, 2 * len(phones), "exact")
+
+    # symbol stage: variants with 1..max_symbols symbols of every seed (the
+    # 0-symbol variant is the seed itself), plus those of the seed's leet form when
+    # that is not a seed already (pair seeds, and every seed when sampling)
+    st = est.add(StageEstimate("symbols", kind="estimate" if symbol_mode != "exhaustive" else "bound"))
+    if use_symbols and remaining > 0:
+        weights = symbol_prob_weights
+        symbol_chars = SYMBOL_CHARS
+        if policy is not None:
+            symbol_chars = [c for c in SYMBOL_CHARS if c not in policy.banned]
+            if policy.needs_symbol:
+                weights = list(weights or [1.0] * (max_symbols + 1))
+                weights[0] = 0.0
+        if symbol_chars and (not weights or sum(weights) > 0):
+            injector = SymbolInjector(max_symbols, symbol_chars, random.Random(0), weights, mode=symbol_mode)
+            pair_share = min(1.0, min(pairs.supplied or PAIR_SEED_CAP, PAIR_SEED_CAP) /
+                             max(1, sum(seeds.values())))
+            new = walked_total = 0.0
+            fewest = 1 if policy is not None and policy.needs_symbol else 0
+            for (n, d, a), c in seeds.items():
+                if policy is not None and not policy.range_ok(n + fewest, n + max_symbols):
+                    continue   # seeds that cannot reach an allowed length are dropped
+                counts = symbol_variant_counts(n, injector)
+                # leet forms of the seeds that have letters
+                chain = walk_chain = 0.0
+                if use_leet and a:
+                    sampled = injector.mode == "sample" or (injector.mode == "auto" and
+                                                             injector.space_size(n) > injector.exhaustive_limit)
+                    chain = 1.0 if sampled else pair_share
+                    walk_chain = 1.0
+                for k, v in counts.items():
+                    walked_total += c * v * (1 + walk_chain)
+                    if k:
+                        new += policy_count({(n, d, a): c * v * (1 + chain)}, policy, symbols=k)
+            st.space = int(new)
+            st.supplied = int(min(remaining, new))
+            st.proposed = int(walked_total * (st.supplied / new)) if new else 0
+            st.seconds = st.proposed * ESTIMATE_COST_US["symbols"] / 1e6
+            remaining -= st.supplied
+            emitted += st.supplied
+
+    if remaining > 0 and emits["extras"] and walked < 1:
+        left = {k: c * max(0.0, 1 - pairs.supplied / max(1, pairs.space)) for k, c in pair_hist.items()}
+        take("extras", left, pair_mult, 2 * pair_walk, "bound", unseen=walked, repeat=2,
+                      words=sum(left.values()))
+    else:
+        est.add(StageEstimate("extras"))
+
+    # memory: the dedup holds every emitted word (shards keep their own as well);
+    # symbol seeds and the listed base table are kept too
+    est.memory = emitted * ESTIMATE_DEDUP_BYTES.get(dedup, ESTIMATE_DEDUP_BYTES["set"]) * (2 if workers > 1 else 1)
+    if dedup == "spill":
+        est.memory += ESTIMATE_SPILL_BUFFER
+    est.memory += int(sum(seeds.values())) * ESTIMATE_ITEM_BYTES
+    if pairs.proposed and raw <= PAIR_LIST_MAX:
+        est.memory += raw * ESTIMATE_ITEM_BYTES * workers
+    est.estimate_seconds = time.perf_counter() - t0
+    return est
+
+# -------------------------
+# PARALLEL (SHARDED) GENERATION
+# -------------------------
+PARALLEL_BATCH = 2000
+
+def run_shard(out_queue, stop_event, profile, gen_kwargs, index, count, batch_size):
+    """
+    Process body for one shard: runs iter_final_wordlist on slice index/count with a
+    local dedup and sends newline-joined batches; None marks the end (or ("error", msg)).
+    """
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        batch = []
+        for w in iter_final_wordlist(profile, shard=(index, count), **gen_kwargs):
+            batch.append(w)
+            if len(batch) >= batch_size:
+                if not put("\n".join(batch)):
+                    return
+                batch = []
+        if batch and not put("\n".join(batch)):
+            return
+        put(None)
+    except Exception as e:
+        put(("error", f"{type(e).__name__}: {e}"))
+
+def get_unless_cancelled(q, cancel, poll=0.2):
+    # q.get(), returning cancel itself once it is set
+    while not cancel.is_set():
+        try:
+            return q.get(timeout=poll)
+        except queue.Empty:
+            pass
+    return cancel
+
+def iter_parallel_wordlist(profile, workers=None, target_count=5000, random_seed=None,
+                           dedup="set", shard_dedup=None, batch_size=PARALLEL_BATCH, stats=None, cancel=None,
+                           **gen_kwargs):
+    """
+    Sharded iter_final_wordlist over a process pool. Every shard derives the shared
+    permutations from the same master seed and takes an interleaved slice of each
+    stage, so shards never repeat each other's index ranges; per-shard randomness is
+    seeded from (random_seed, shard). Shards dedup locally, the parent merges their
+    batches round-robin in shard order through the global dedup and stops at exactly
+    target_count, so the output is identical for a given seed and worker count.
+    Each shard keeps at most a few batches queued ahead of the parent.
+    shard_dedup is the mode of the shards' local dedup (defaults to dedup when it is a mode name).
+    stats only sees the parent's "merge" step (shard-local stages run in other processes).
+    cancel (a threading.Event) stops the merge and the shards while it waits for batches.
+    """
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    random_seed = random_seed or random.randint(1, 1_000_000_000)
+    plan = -(-target_count // workers) if target_count else 0
+    shard_kwargs = dict(gen_kwargs, random_seed=random_seed, target_count=0, plan_target=plan,
+                        dedup=shard_dedup or (dedup if isinstance(dedup, str) else "set"))
+
+    ctx = multiprocessing.get_context()
+    stop_event = ctx.Event()
+    queues = [ctx.Queue(maxsize=4) for _ in range(workers)]
+    procs = [ctx.Process(target=run_shard, daemon=True,
+                         args=(queues[i], stop_event, profile, shard_kwargs, i, workers, batch_size))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+
+    own_dedup = isinstance(dedup, str)
+    seen = make_dedup(dedup, capacity=target_count) if own_dedup else dedup
+    stats = stats if stats is not None else GenerationStats()
+    stats.start(target_count)
+    st = stats.begin("merge")
+    emitted = 0
+    live = list(range(workers))
+    try:
+        while live:
+            for i in list(live):
+                item = queues[i].get() if cancel is None else get_unless_cancelled(queues[i], cancel)
+                if item is cancel:
+                    st.exit = "cancelled"
+                    return
+                if item is None:
+                    live.remove(i)
+                    continue
+                if isinstance(item, tuple):
+                    raise RuntimeError(f"shard {i} failed: {item[1]}")
+                for w in item.split("\n"):
+                    st.proposed += 1
+                    if not seen.add(w):
+                        st.duplicates += 1
+                        continue
+                    emitted += 1
+                    st.accepted += 1
+                    yield w
+                    if target_count and emitted >= target_count:
+                        st.exit = "target"
+                        return
+        st.exit = "exhausted"
+    except GeneratorExit:
+        st.exit = st.exit or "closed"
+        raise
+    finally:
+        st.seconds = stats.elapsed
+        stats.finish()
+        stop_event.set()
+        for q in queues:
+            try:
+                while True:
+                    q.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                pass
+        for p in procs:
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        for q in queues:
+            q.close()
+            q.cancel_join_thread()
+        if own_dedup:
+            seen.close()
+
+# -------------------------
+# OUTPUT SINK
+# -------------------------
+COMPRESSIONS = ("auto", "none", "gzip", "xz", "zstd")
+COMPRESSION_EXTS = {".gz": "gzip", ".xz": "xz", ".zst": "zstd", ".zstd": "zstd"}
+WRITE_CHUNK = 16384   # words joined per write() call
+STREAM_BLOCK = 1 << 20       # bytes per write() when streaming to a pipe / stdout
+STREAM_PIPE_SIZE = 1 << 20   # kernel pipe buffer asked for on Linux (the default unprivileged maximum)
+
+def compression_for(path, compression="auto"):
+    if compression in (None, "auto"):
+        return COMPRESSION_EXTS.get(os.path.splitext(path)[1].lower(), "none")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"unknown compression {compression!r} (expected one of {', '.join(COMPRESSIONS)})")
+    return compression
+
+def open_compressed(raw, compression, level=None):
+    # wrap a binary file object in a streaming compressor
+    if compression == "none":
+        return raw
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6 if level is None else level)
+    if compression == "xz":
+        return lzma.LZMAFile(raw, "wb", preset=level)
+    try:
+        from compression import zstd   # Python 3.14+
+        return zstd.ZstdFile(raw, "wb", level=level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd output needs Python 3.14+ or the zstandard package (pip install zstandard)")
+    return zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(raw, closefd=False)
+
+class WordlistWriter:
+    """
+    Atomic, buffered wordlist writer: words are joined WRITE_CHUNK at a time and
+    written (optionally through gzip/xz/zstd) to a temp file next to path, which is
+    renamed over path only when the writer is closed without error. On error the
+    temp file is removed and any existing file at path is left untouched.
+    Use as a context manager; write_many() streams any iterable.
+    """
+    def __init__(self, path, compression="auto", encoding="utf-8", level=None):
+        self.path = path
+        self.compression = compression_for(path, compression)
+        self.encoding = encoding
+        self.count = 0
+        d = os.path.dirname(os.path.abspath(path))
+        fd, self.tmp_path = tempfile.mkstemp(dir=d, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+        self.raw = os.fdopen(fd, "wb")
+        try:
+            self.stream = open_compressed(self.raw, self.compression, level)
+        except BaseException:
+            self.abort()
+            raise
+
+    def write_many(self, words):
+        enc = self.encoding
+        it = iter(words)
+        while True:
+            chunk = list(itertools.islice(it, WRITE_CHUNK))
+            if not chunk:
+                break
+            self.stream.write(("\n".join(chunk) + "\n").encode(enc))
+            self.count += len(chunk)
+        return self.count
+
+    def write(self, word):
+        self.stream.write((word + "\n").encode(self.encoding))
+        self.count += 1
+
+    def close(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(self.tmp_path, 0o666 & ~mask)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        for f in (getattr(self, "stream", None), self.raw):
+            try:
+                if f is not None:
+                    f.close()
+            except Exception:
+                pass
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def write_wordlist(words, path, encoding="utf-8", compression="auto"):
+    """
+    Write words (any iterable, e.g. iter_final_wordlist(...)) to path, one per line,
+    through a WordlistWriter (chunked, atomic; compressed by extension or by name).
+    Returns the number of words written.
+    """
+    with WordlistWriter(path, compression=compression, encoding=encoding) as out:
+        return out.write_many(words)
 
-def years_from_age(age_str):
-    ys = []
+def is_stream_path(path):
+    """'-' (stdout), named pipes and character devices are streamed to in place, not via a temp file."""
+    if path == "-":
+        return True
     try:
-        if not age_str:
-            return ys
-        age = int(str(age_str).strip())
-        cy = datetime.now().year
-        by = cy - age
-        ys.append(str(by))
-        ys.append(str(by)[-2:])
-    except Exception:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISCHR(mode)
+
+def grow_pipe(f, size=STREAM_PIPE_SIZE):
+    # fewer, larger hand-overs between generator and reader; no-op off Linux or for non-pipes
+    try:
+        import fcntl
+        fcntl.fcntl(f.fileno(), fcntl.F_SETPIPE_SZ, size)
+    except (ImportError, AttributeError, OSError, ValueError):
         pass
-    return ys
 
-def expand_profile_tokens(profile):
-    tokens = set()
-    def add(v):
-        if not v:
-            return
-        if isinstance(v, list):
-            for it in v:
-                s = clean_token(it)
-                if s: tokens.add(s)
+class PipeWriter:
+    """
+    Streams words to stdout ('-'), a named pipe or a character device in blocks of
+    about block_bytes, with plain blocking writes: when the reader (hashcat --stdin,
+    john --stdin) falls behind, write() blocks and so does the generator, so memory
+    stays at one block however long the run. A named pipe is opened when its reader
+    is there. If the reader goes away (EPIPE; Python ignores SIGPIPE) write_many stops,
+    closes the word iterator (a parallel run's workers with it) and sets broken; the
+    stream is pointed at /dev/null so later flushes (and interpreter exit) stay quiet.
+    count is the number of words handed to the OS.
+    """
+    def __init__(self, path="-", compression="auto", encoding="utf-8", block_bytes=STREAM_BLOCK, level=None):
+        self.path = path
+        self.compression = "none" if path == "-" and compression in (None, "auto") else compression_for(path, compression)
+        self.encoding = encoding
+        self.block_bytes = block_bytes
+        self.count = 0
+        self.broken = False
+        if path == "-":
+            sys.stdout.flush()
+            self.raw, self.own = sys.stdout.buffer, False
         else:
-            s = clean_token(v)
-            if s: tokens.add(s)
-    add(profile.get("first_name"))
-    add(profile.get("last_name"))
-    add(profile.get("partner"))
-    add(profile.get("pet"))
-    add(profile.get("company"))
-    add(profile.get("nicknames", []))
-    add(profile.get("keywords", []))
-    add(profile.get("years", []))
-    email = profile.get("email")
-    if email:
-        local = email.split("@", 1)[0]
-        localc = clean_token(local)
-        if localc:
-            tokens.add(localc)
-    fn = clean_token(profile.get("first_name","") or "")
-    ln = clean_token(profile.get("last_name","") or "")
-    if fn and ln:
-        tokens.add(fn + ln)
-        tokens.add(fn + "." + ln)
-        tokens.add(fn[0] + ln)
-        tokens.add(fn + ln[0])
-    return sorted(tokens)
+            self.raw, self.own = open(path, "wb"), True
+        grow_pipe(self.raw)
+        self.stream = open_compressed(self.raw, self.compression, level)
 
-# -------------------------
-# BASE PERMUTATIONS WITHOUT SYMBOLS
-# -------------------------
-def base_permutations(tokens, birth_years=None, phones=None, use_separators=True):
-    out = set()
-    years = birth_years or []
-    phones = phones or []
+    def write_many(self, words):
+        enc, limit = self.encoding, self.block_bytes
+        it = iter(words)
+        block, size, pending = [], 0, 0
+        try:
+            while True:
+                chunk = list(itertools.islice(it, WRITE_CHUNK))
+                if chunk:
+                    data = ("\n".join(chunk) + "\n").encode(enc)
+                    block.append(data)
+                    size += len(data)
+                    pending += len(chunk)
+                if size >= limit or (not chunk and block):
+                    self.stream.write(b"".join(block))
+                    self.count += pending
+                    block, size, pending = [], 0, 0
+                if not chunk:
+                    break
+        except BrokenPipeError:
+            self.reader_gone()
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+        return self.count
 
-    for t in tokens:
-        out.add(t)
-        for pre in COMMON_PREFIXES:
-            for suf in COMMON_SUFFIXES:
-                cand = f"{pre}{t}{suf}".strip()
-                if cand:
-                    out.add(cand)
-        for y in years:
-            out.add(f"{t}{y}")
-            out.add(f"{t}{y[-2:]}")
+    def reader_gone(self):
+        self.broken = True
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            os.dup2(devnull, self.raw.fileno())
+        finally:
+            os.close(devnull)
 
-    for t in tokens:
-        for p in phones:
-            if not p:
-                continue
-            last4 = p[-4:] if len(p) >= 4 else p
-            last3 = p[-3:] if len(p) >= 3 else p
-            first3 = p[:3] if len(p) >= 3 else p
-            variants = [p, last4, last3, first3]
-            for v in variants:
-                out.add(f"{t}{v}")
-                out.add(f"{v}{t}")
-                if use_separators:
-                    for s in SEPARATORS:
-                        out.add(f"{t}{s}{v}")
-                        out.add(f"{v}{s}{t}")
-
-    for a, b in itertools.permutations(tokens, 2):
-        if use_separators:
-            for sep in SEPARATORS:
-                for suf in COMMON_SUFFIXES:
-                    out.add(f"{a}{sep}{b}{suf}".strip())
-        else:
-            out.add(f"{a}{b}")
+    def close(self):
+        try:
+            if self.stream is not self.raw:
+                self.stream.close()
+            self.raw.flush()
+        except BrokenPipeError:
+            self.reader_gone()
+        finally:
+            if self.own:
+                self.raw.close()
 
-    for p in phones:
-        last4 = p[-4:] if len(p) >= 4 else p
-        out.add(p)
-        out.add(last4)
-        for y in years:
-            out.add(f"{p}{y}")
-            out.add(f"{last4}{y}")
+    def __enter__(self):
+        return self
 
-    return sorted([o for o in out if o])
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
 
-# -------------------------
-# LEET VARIANTS
-# -------------------------
-def leet_variants(word):
-    w = str(word)
-    le = w.translate(LEET_MAP)
-    return le if le and le != w else None
+def write_resumable(profile, path, checkpoint_path, target_count=5000, every=CHECKPOINT_EVERY,
+                    encoding="utf-8", **gen_kwargs):
+    """
+    Generate into a plain-text wordlist that survives crashes and can be topped up.
+    Every `every` words (and at the end) path is flushed and fsynced and a Checkpoint
+    is saved to checkpoint_path together with the file size. If checkpoint_path
+    exists, that run continues instead: path is cut back to the checkpointed size
+    (words written after it come out again), its words refill the dedup and the
+    symbol seeds, and new words are appended until path holds target_count words
+    (0 = everything). Returns (words in path, words added by this call).
+    """
+    if compression_for(path) != "none":
+        raise ValueError("resumable output must be uncompressed text")
+    checkpoint = Checkpoint.load(checkpoint_path) if os.path.exists(checkpoint_path) else Checkpoint()
+    prior_bytes = 0
+    if checkpoint.resume_state is not None:
+        state = checkpoint.resume_state
+        if os.path.abspath(state.get("output", path)) != os.path.abspath(path):
+            raise ValueError(f"{checkpoint_path} belongs to {state['output']}, not {path}")
+        prior_bytes = state.get("output_bytes", 0)
+        if not os.path.exists(path) or os.path.getsize(path) < prior_bytes:
+            raise ValueError(f"{path} is shorter than {checkpoint_path} records ({prior_bytes} bytes)")
+
+    def earlier_words():
+        with open(path, "rb") as fh:
+            for line in fh:
+                yield line[:-1].decode(encoding)
+
+    with open(path, "r+b" if prior_bytes else "wb") as fh:
+        fh.truncate(prior_bytes)
+        fh.seek(prior_bytes)
+        words = iter_final_wordlist(profile, target_count=target_count, checkpoint=checkpoint,
+                                    resume_words=earlier_words(), **gen_kwargs)
+        added = since_save = 0
+        try:
+            while True:
+                # never past the next checkpoint, so saves land every `every` words
+                chunk = list(itertools.islice(words, max(1, min(WRITE_CHUNK, every - since_save))))
+                if chunk:
+                    fh.write(("\n".join(chunk) + "\n").encode(encoding))
+                    added += len(chunk)
+                    since_save += len(chunk)
+                # the generator is parked right after the last word of chunk,
+                # so its state matches what is in the file once flushed
+                if since_save >= every or not chunk:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                    state = checkpoint.save(checkpoint_path, output=os.path.abspath(path), output_bytes=fh.tell())
+                    since_save = 0
+                if not chunk:
+                    break
+        finally:
+            words.close()
+    return state["emitted"], added
 
 # -------------------------
-# SYMBOL INJECTION (probabilistic)
+# BATCH (MULTI-PROFILE) GENERATION
 # -------------------------
-def parse_prob_weights(text, max_symbols):
+# One wordlist per profile over a process pool, plus an optional merged list.
+# Each worker keeps the tokens two or more profiles share (company names, common
+# keywords) as one interned string, seeded into its StageCache so the generator
+# picks them up; the merge is a k-way merge of per-profile sorted runs, so the
+# parent never holds more than one word per profile.
+BATCH_META_FIELDS = ("id", "target_count")
+BATCH_CACHE_ITEMS = 500_000   # per worker; tokens of many profiles, large base tables are not kept
+
+def load_batch_profiles(path, target_count=5000):
     """
-    parse a CSV of weights (weights for 0..max_symbols).
-    if invalid or length mismatch, return None => caller will use uniform default.
+    Read many profiles from CSV (header row of profile keys) or JSONL (one mapping
+    per line). Besides the profile keys a record may give "id" (used to name its
+    wordlist) and "target_count" (else target_count). List fields are lists or
+    comma separated. Returns [(id, profile, target_count)] in file order.
     """
-    if not text:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (".csv", ".jsonl", ".ndjson"):
+        raise ValueError(f"{path}: batch files must be .csv or .jsonl")
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        if ext == ".csv":
+            rows = [(n, row) for n, row in enumerate(csv.DictReader(fh), 2)]
+        else:
+            rows = []
+            for n, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        rows.append((n, json.loads(line)))
+                    except ValueError as e:
+                        raise ValueError(f"{path}:{n}: {e}")
+    records, ids = [], set()
+    for n, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"{path}:{n}: expected a mapping")
+        prof = normalize_profile(row)
+        target = row.get("target_count")
+        try:
+            target = target_count if target in (None, "") else int(target)
+        except (TypeError, ValueError):
+            raise ValueError(f"{path}:{n}: target_count must be an integer")
+        if target < 0:
+            raise ValueError(f"{path}:{n}: target_count must be >= 0")
+        name = str(row.get("id") or "").strip() or "_".join(
+            filter(None, (clean_token(prof["first_name"]), clean_token(prof["last_name"])))) or "profile"
+        pid = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in name).strip(".") or "profile"
+        if pid in ids:
+            pid = f"{pid}_{len(records) + 1}"
+        ids.add(pid)
+        records.append((pid, prof, target))
+    return records
+
+def shared_tokens(profiles):
+    """Expanded tokens that two or more profiles have in common, interned."""
+    counts = collections.Counter(t for prof in profiles for t in expand_profile_tokens(prof))
+    return sorted(sys.intern(t) for t, n in counts.items() if n > 1)
+
+def batch_seed(random_seed, profile_id):
+    # per-profile seed derived from the run seed, so a batch is reproducible
+    if not random_seed:
         return None
-    parts = [p.strip() for p in text.split(",") if p.strip() != ""]
+    digest = hashlib.blake2b(f"{random_seed}/{profile_id}".encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "little") or 1
+
+_batch_worker = {}
+
+def init_batch_worker(tokens, cache_dir=None, cache_max_bytes=512 << 20):
+    # unpickled once per worker: every profile this worker runs reuses these strings
+    _batch_worker["tokens"] = {t: t for t in tokens}
+    _batch_worker["cache"] = StageCache(max_items=BATCH_CACHE_ITEMS, disk_dir=cache_dir,
+                                        disk_max_bytes=cache_max_bytes)
+
+def run_batch_profile(task):
+    """Pool task: one profile's wordlist (and, for merging, its sorted run)."""
+    pid, prof, target, path, run_path, compression, gen_kwargs = task
+    t0 = time.perf_counter()
+    shared, cache = _batch_worker["tokens"], _batch_worker["cache"]
+    cache.put(cache_key("tokens", profile_cache_key(prof)),
+              [shared.get(t, t) for t in expand_profile_tokens(prof)])
+    stats = GenerationStats()
+    words = iter_final_wordlist(prof, target_count=target, cache=cache, stats=stats,
+                                random_seed=batch_seed(gen_kwargs.get("random_seed"), pid),
+                                **{k: v for k, v in gen_kwargs.items() if k != "random_seed"})
+    if run_path is None:
+        count = write_wordlist(words, path, compression=compression)
+    else:
+        words = list(words)
+        count = write_wordlist(words, path, compression=compression)
+        words.sort()
+        write_wordlist(words, run_path, compression="none")
+    return {"id": pid, "path": path, "words": count, "target": target,
+            "seconds": round(time.perf_counter() - t0, 3), "stats": stats.as_dict()}
+
+def merge_sorted_runs(run_paths, merged_path, counts_path, compression="auto"):
+    """
+    k-way merge of sorted, per-profile unique runs into one deduplicated list and
+    a word<TAB>profiles TSV (how many profiles produced each word). Returns the word count.
+    """
+    files = [open(p, "r", encoding="utf-8") for p in run_paths]
     try:
-        nums = [float(p) for p in parts]
-    except Exception:
-        return None
-    if len(nums) != max_symbols + 1:
-        return None
-    # if all zeros or sum zero -> invalid
-    if all(n == 0 for n in nums):
-        return None
-    return nums
+        lines = heapq.merge(*(map(str.rstrip, f) for f in files))
+        with WordlistWriter(merged_path, compression=compression) as out, \
+                WordlistWriter(counts_path, compression="none") as tsv:
+            for word, group in itertools.groupby(lines):
+                out.write(word)
+                tsv.write(f"{word}\t{sum(1 for _ in group)}")
+            return out.count
+    finally:
+        for f in files:
+            f.close()
 
-def inject_symbols_by_probability(word, max_symbols, symbol_chars, rng, prob_weights=None):
+def counts_path_for(merged_path):
+    # all.txt.gz -> all.counts.tsv
+    root = merged_path
+    if compression_for(root) != "none":
+        root = os.path.splitext(root)[0]
+    return os.path.splitext(root)[0] + ".counts.tsv"
+
+def run_batch(records, out_dir, workers=None, merged_path=None, counts_path=None, compression="auto",
+              suffix=".txt", progress=None, cache_dir=None, cache_max_bytes=512 << 20, **gen_kwargs):
     """
-    Return a set of variants for a single word.
-    Each variant is created by:
-      - sampling k from 0..max_symbols using prob_weights (or uniform)
-      - if k==0, variant may be the original word
-      - if k>0, insert k symbols at random insertion positions
-    We produce a sampled set (not exhaustive) to avoid explosion.
+    Generate a wordlist per (id, profile, target_count) record into out_dir/<id><suffix>,
+    one profile per pool worker at a time (workers = processes, default one per CPU).
+    gen_kwargs go to iter_final_wordlist (dedup must be a mode name); random_seed, if
+    given, seeds every profile reproducibly. progress(done, total, result) is called in
+    the parent as profiles finish. With merged_path the per-profile lists are also
+    merged into one deduplicated list plus a provenance TSV (counts_path, default
+    counts_path_for(merged_path)). Returns a summary dict with the per-profile results.
     """
-    variants = set()
-    L = len(word)
-    if L == 0:
-        return variants
-
-    # default weights
-    if not prob_weights or len(prob_weights) != max_symbols + 1:
-        prob_weights = [1.0] * (max_symbols + 1)
-    total = sum(prob_weights)
-    if total <= 0:
-        prob_weights = [1.0] * (max_symbols + 1)
-        total = sum(prob_weights)
-    weights = [w / total for w in prob_weights]
-
-    tries = max(8, min(200, max_symbols * 12))
-    for _ in range(tries):
-        k = rng.choices(range(0, max_symbols + 1), weights=weights, k=1)[0]
-        if k == 0:
-            variants.add(word)
-            continue
-        syms = [rng.choice(symbol_chars) for _ in range(k)]
-        # choose k insertion indices among 0..L inclusive, allowing duplicates
-        insert_positions = [rng.randint(0, L) for _ in range(k)]
-        pos_map = {}
-        for pos, s in zip(insert_positions, syms):
-            pos_map.setdefault(pos, []).append(s)
-        pieces = []
-        for i in range(0, L + 1):
-            if i in pos_map:
-                pieces.append("".join(pos_map[i]))
-            if i < L:
-                pieces.append(word[i])
-        candidate = "".join(pieces)
-        variants.add(candidate)
-        if len(variants) >= 300:
-            break
-    return variants
+    if not isinstance(gen_kwargs.get("dedup", "set"), str):
+        raise ValueError("batch runs need a dedup mode name (each profile builds its own)")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(records) or 1))
+    run_dir = tempfile.mkdtemp(prefix="cuppx-batch-") if merged_path else None
+    tasks = [(pid, prof, target, os.path.join(out_dir, pid + suffix),
+              os.path.join(run_dir, f"{i}.run") if run_dir else None, compression, gen_kwargs)
+             for i, (pid, prof, target) in enumerate(records)]
+    t0 = time.perf_counter()
+    results = [None] * len(tasks)
+    order = {task[0]: i for i, task in enumerate(tasks)}
+    try:
+        ctx = multiprocessing.get_context()
+        with ctx.Pool(workers, initializer=init_batch_worker,
+                      initargs=(shared_tokens([prof for _, prof, _ in records]), cache_dir, cache_max_bytes)) as pool:
+            for done, res in enumerate(pool.imap_unordered(run_batch_profile, tasks), 1):
+                results[order[res["id"]]] = res
+                if progress is not None:
+                    progress(done, len(tasks), res)
+        merged = None
+        if merged_path:
+            counts_path = counts_path or counts_path_for(merged_path)
+            merged = merge_sorted_runs([task[4] for task in tasks], merged_path, counts_path, compression)
+    finally:
+        if run_dir:
+            shutil.rmtree(run_dir, ignore_errors=True)
+    return {"profiles": len(results), "words": sum(r["words"] for r in results), "merged_words": merged,
+            "merged_path": merged_path, "counts_path": counts_path if merged_path else None,
+            "seconds": round(time.perf_counter() - t0, 3), "results": results}
 
 # -------------------------
-# FINAL WORDLIST GENERATOR
+# CRACKER RULE EXPORT (hashcat / John)
 # -------------------------
-def generate_final_wordlist(profile, use_leet=True, use_symbols=False, max_symbols=2,
-                            target_count=5000, random_seed=None, symbol_prob_weights=None):
-    rng = random.Random(random_seed or random.randint(1, 1_000_000_000))
+# hashcat rule functions: ':' no-op, '$X' append X, '^X' prepend X, 'sXY' replace X by Y.
+# John's wordlist rules understand the same commands, so both formats share the lines,
+# except that John runs rules through a preprocessor first: its special characters
+# ([ ] for character classes, - for ranges, \ itself) are escaped with a backslash.
+RULE_FORMATS = ("hashcat", "john")
+LEET_RULE = " ".join(f"s{a}{b}" for a, b in zip("aeiostl", "4310571"))
+JOHN_SPECIAL = frozenset("[]\\-")
 
-    tokens = expand_profile_tokens(profile)
-    phones = []
-    if profile.get("phone"):
-        mainp = digit_only(profile.get("phone"))
-        if mainp:
-            phones.append(mainp)
-    for pn in profile.get("add_numbers", []) or []:
-        pcd = digit_only(pn)
-        if pcd:
-            phones.append(pcd)
-    phones = sorted(set(phones))
+def rule_char(ch, fmt="hashcat"):
+    return "\\" + ch if fmt == "john" and ch in JOHN_SPECIAL else ch
 
-    years = list(sorted(set([y for y in profile.get("years", []) if str(y).strip().isdigit()] + years_from_age(profile.get("age")))))
-    base = base_permutations(tokens, birth_years=years, phones=phones, use_separators=True)
-    if not base:
-        base = tokens[:]
+def rule_append(s, fmt="hashcat"):
+    return "".join(f"${rule_char(ch, fmt)}" for ch in s)
 
-    result = []
-    seen = set()
-    order = list(base)
-    rng.shuffle(order)
+def rule_prepend(s, fmt="hashcat"):
+    return "".join(f"^{rule_char(ch, fmt)}" for ch in reversed(s))
 
-    def push_candidate(c):
-        cc = clean_token(c)
-        if not cc:
-            return False
-        if cc in seen:
-            return False
-        seen.add(cc)
-        result.append(cc)
-        return True
+def build_mangling_rules(years=None, phones=None, use_leet=True, prefixes=None, suffixes=None, separators=None,
+                         fmt="hashcat"):
+    """
+    The single-word part of the base rules as cracker rules: prefix/suffix affixes,
+    year and short-year appends, phone variants appended/prepended with every
+    separator, and (use_leet) the same lines followed by the LEET_MAP substitutions.
+    fmt="john" escapes characters John's rule preprocessor would interpret.
+    Returns [(rule, added_length)] without duplicates, ':' first.
+    """
+    years = list(years or [])
+    phones = [p for p in (phones or []) if p]
+    prefixes = COMMON_PREFIXES if prefixes is None else list(prefixes)
+    suffixes = COMMON_SUFFIXES if suffixes is None else list(suffixes)
+    separators = SEPARATORS if separators is None else list(separators)
+    phone_variants = []
+    for p in phones:
+        phone_variants += [p, p[-4:], p[-3:], p[:3]]
 
-    # 1) base seeds
-    for cand in order:
-        if target_count and len(result) >= target_count:
-            break
-        push_candidate(cand)
+    rules = {":": 0}
+    def add(pre, suf):
+        parts = [x for x in (rule_prepend(pre, fmt), rule_append(suf, fmt)) if x]
+        if parts:
+            rules.setdefault(" ".join(parts), len(pre) + len(suf))
 
-    # 2) leet variants
+    for pre in prefixes:
+        for suf in suffixes:
+            add(pre, suf)
+    for y in years:
+        add("", y)
+        add("", y[-2:])
+    for v in phone_variants:
+        for sep in [""] + separators:
+            add("", sep + v)
+            add(v + sep, "")
+    out = list(rules.items())
     if use_leet:
-        for cand in order:
-            if target_count and len(result) >= target_count:
-                break
-            lv = leet_variants(cand)
-            if lv:
-                push_candidate(lv)
-
-    # 3) combine pairs (sampled)
-    if not target_count or len(result) < target_count:
-        pairs = []
-        for a, b in itertools.permutations(order, 2):
-            pairs.append(f"{a}{b}")
-            if len(pairs) >= 20000:
-                break
-        rng.shuffle(pairs)
-        for cand in pairs:
-            if target_count and len(result) >= target_count:
-                break
-            push_candidate(cand)
+        out += [(f"{r} {LEET_RULE}" if r != ":" else LEET_RULE, d) for r, d in out]
+    return out
 
-    # 4) phone derived
-    if phones and (not target_count or len(result) < target_count):
-        for p in phones:
-            if target_count and len(result) >= target_count: break
-            push_candidate(p)
-            last4 = p[-4:]
-            push_candidate(last4)
-
-    # 5) symbol injection (probabilistic)
-    if use_symbols and (not target_count or len(result) < target_count):
-        seed_list = list(seen)[:]
-        rng.shuffle(seed_list)
-        for seed in seed_list:
-            if target_count and len(result) >= target_count:
-                break
-            variants = inject_symbols_by_probability(seed, max_symbols, SYMBOL_CHARS, rng, symbol_prob_weights)
-            for v in variants:
-                if target_count and len(result) >= target_count:
+def export_cracker_rules(profile, path_prefix, use_leet=True, rule_config=None, fmt="hashcat"):
+    """
+    Write the compact inputs for on-device expansion instead of the expanded list:
+      <prefix>.words.txt   base tokens (expand_profile_tokens) + phones and their last 4 digits
+      <prefix>.rule        the equivalent mangling rules (hashcat -r / john --rules)
+    Every rule applies to every word, so the cracker produces a superset of the
+    generator's single-word base (and leet) candidates. Token pairs are not
+    single-word rules: run them as a combinator attack (hashcat -a 1 words words)
+    if needed. Returns a size report (dict).
+    """
+    if fmt not in RULE_FORMATS:
+        raise ValueError(f"unknown rule format {fmt!r} (expected one of {', '.join(RULE_FORMATS)})")
+    tokens = expand_profile_tokens(profile)
+    phones = profile_phones(profile)
+    years = profile_years(profile)
+    words = list(dict.fromkeys(clean_token(t) for t in tokens + phones + [p[-4:] for p in phones]))
+    words = [w for w in words if w]
+    rules = build_mangling_rules(years, phones, use_leet=use_leet, fmt=fmt, **(rule_config or {}))
+
+    words_path = f"{path_prefix}.words.txt"
+    rule_path = f"{path_prefix}.rule"
+    with open(words_path, "w", encoding="utf-8") as fh:
+        fh.write("".join(w + "\n" for w in words))
+    with open(rule_path, "w", encoding="utf-8") as fh:
+        if fmt == "john":
+            fh.write("[List.Rules:CUPPX]\n")
+        else:
+            fh.write("## CUPP-X mangling rules: hashcat -r this.rule <hash> words.txt\n")
+        fh.write("".join(r + "\n" for r, _ in rules))
+
+    # the cracker expands every word with every rule
+    word_bytes = sum(len(w.encode("utf-8")) + 1 for w in words)
+    expanded_count = len(words) * len(rules)
+    expanded_bytes = len(rules) * word_bytes + len(words) * sum(d for _, d in rules)
+    export_bytes = os.path.getsize(words_path) + os.path.getsize(rule_path)
+    # what the generator itself would list for the same single-word part
+    est = estimate_keyspace(profile, use_leet=use_leet, target_count=0, rule_config=rule_config)
+    generated = est.stages["base"].space + est.stages["leet"].space
+    return {
+        "words_path": words_path, "rule_path": rule_path,
+        "words": len(words), "rules": len(rules),
+        "expanded_words": expanded_count, "expanded_bytes": expanded_bytes,
+        "export_bytes": export_bytes,
+        "ratio": expanded_bytes / export_bytes if export_bytes else 0.0,
+        "generated_words": generated,
+    }
+
+# -------------------------
+# BACKGROUND WORKER
+# -------------------------
+class GenerationWorker(threading.Thread):
+    """
+    Runs iter_final_wordlist on a daemon thread and reports over a queue:
+      ("words", [w, ...])   a batch of new candidates (sent every BATCH words or FLUSH_SECS)
+      ("done", cancelled)   finished normally (False) or stopped by cancel() (True)
+      ("error", exc)        generation raised
+    Everything produced before a cancel is still delivered.
+    """
+    BATCH = 5000
+    FLUSH_SECS = 0.1
+
+    def __init__(self, profile, **gen_kwargs):
+        super().__init__(daemon=True)
+        self.profile = profile
+        self.stats = gen_kwargs.setdefault("stats", GenerationStats())
+        self.gen_kwargs = gen_kwargs
+        self.queue = queue.Queue()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for w in iter_final_wordlist(self.profile, cancel=self._cancel, **self.gen_kwargs):
+                if self._cancel.is_set():
                     break
-                push_candidate(v)
-            # also apply leet + symbols occasionally
-            if use_leet and (not target_count or len(result) < target_count):
-                lv = leet_variants(seed)
-                if lv:
-                    v2 = inject_symbols_by_probability(lv, max_symbols, SYMBOL_CHARS, rng, symbol_prob_weights)
-                    for v in v2:
-                        if target_count and len(result) >= target_count:
-                            break
-                        push_candidate(v)
-
-    # 6) extras
-    if not target_count or len(result) < target_count:
-        extras = []
-        for a, b in itertools.permutations(order, 2):
-            extras.append(f"{a}.{b}")
-            extras.append(f"{a}_{b}")
-            if len(extras) >= 50000:
-                break
-        rng.shuffle(extras)
-        for cand in extras:
-            if target_count and len(result) >= target_count:
-                break
-            push_candidate(cand)
+                batch.append(w)
+                if len(batch) >= self.BATCH or time.monotonic() - last_flush >= self.FLUSH_SECS:
+                    self.queue.put(("words", batch))
+                    batch = []
+                    last_flush = time.monotonic()
+            if batch:
+                self.queue.put(("words", batch))
+            self.queue.put(("done", self._cancel.is_set()))
+        except BaseException as e:
+            if batch:
+                self.queue.put(("words", batch))
+            self.queue.put(("error", e))
+
+# -------------------------
+# FILE-BACKED PREVIEW
+# -------------------------
+class LineIndex:
+    """
+    Random access to the lines of a (possibly still growing) text file through mmap
+    and a sparse line-offset index: one byte offset every STRIDE lines, so 10M lines
+    cost ~1.3 MB of index. refresh() indexes whatever was appended since the last call;
+    only complete (newline-terminated) lines are visible.
+    """
+    STRIDE = 64
+    CHUNK = 4 << 20
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.fh = open(path, "rb")
+        self.mm = None
+        self.size = 0
+        self.checkpoints = array("Q")
+        self.count = 0
+        self.scanned = 0
+        self.refresh()
+
+    def __len__(self):
+        return self.count
+
+    def refresh(self):
+        size = os.fstat(self.fh.fileno()).st_size
+        if size == self.size:
+            return self.count
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+        if self.mm is None:
+            return self.count
+        mm = self.mm
+        end = mm.rfind(b"\n", self.scanned, size)
+        pos = self.scanned
+        while 0 <= pos <= end:
+            nl = mm.rfind(b"\n", pos, min(end + 1, pos + self.CHUNK))
+            if nl < 0:   # a single line longer than CHUNK
+                nl = mm.find(b"\n", pos, end + 1)
+            lines = mm[pos:nl].split(b"\n")
+            # start of line j in the chunk = total length of the lines before it + j newlines
+            starts = [0]
+            starts += itertools.accumulate(map(len, lines[:-1]))
+            first = (-self.count) % self.STRIDE
+            self.checkpoints.extend(pos + starts[j] + j for j in range(first, len(lines), self.STRIDE))
+            self.count += len(lines)
+            pos = nl + 1
+        self.scanned = max(self.scanned, pos)
+        return self.count
+
+    def offset(self, i):
+        if not 0 <= i <= self.count:
+            raise IndexError(i)
+        if i == self.count:
+            return self.scanned
+        k, r = divmod(i, self.STRIDE)
+        pos = self.checkpoints[k]
+        for _ in range(r):
+            pos = self.mm.find(b"\n", pos) + 1
+        return pos
+
+    def line(self, i):
+        return self.lines(i, 1)[0]
+
+    def lines(self, start, n):
+        start = max(0, min(start, self.count))
+        n = max(0, min(n, self.count - start))
+        if not n:
+            return []
+        pos = self.offset(start)
+        out = []
+        for _ in range(n):
+            nl = self.mm.find(b"\n", pos)
+            out.append(self.mm[pos:nl].decode(self.encoding, "replace"))
+            pos = nl + 1
+        return out
+
+    def line_of(self, byte_pos):
+        k = bisect.bisect_right(self.checkpoints, byte_pos) - 1
+        cp = self.checkpoints[k]
+        return k * self.STRIDE + self.mm[cp:byte_pos].count(b"\n")
+
+    def find(self, text, start_line=0, wrap=True):
+        """Line number of the next line containing text, searching from start_line (None if absent)."""
+        needle = text.encode(self.encoding)
+        if not needle or b"\n" in needle or not self.count:
+            return None
+        start_line = max(0, min(start_line, self.count))
+        begin = self.offset(start_line)
+        hit = self.mm.find(needle, begin, self.scanned)
+        if hit < 0 and wrap and begin:
+            hit = self.mm.find(needle, 0, min(self.scanned, begin + len(needle) - 1))
+        return None if hit < 0 else self.line_of(hit)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.fh.close()
+
+class ResultSpool:
+    """Temp file that generated words are appended to; previewed through LineIndex and streamed on save."""
+    def __init__(self, encoding="utf-8"):
+        fd, self.path = tempfile.mkstemp(prefix="cuppx-", suffix=".txt")
+        self.fh = os.fdopen(fd, "wb")
+        self.encoding = encoding
+        self.count = 0
+
+    def append(self, words):
+        if words:
+            self.fh.write(("\n".join(words) + "\n").encode(self.encoding))
+            self.count += len(words)
+
+    def flush(self):
+        self.fh.flush()
 
-    # trim
-    if target_count and len(result) > target_count:
-        result = result[:target_count]
+    def words(self):
+        self.flush()
+        with open(self.path, "r", encoding=self.encoding, newline="\n") as fh:
+            for line in fh:
+                yield line[:-1]
 
-    return result
+    def close(self):
+        if not self.fh.closed:
+            self.fh.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
 
 # -------------------------
 # GUI
 # -------------------------
+def load_tk():
+    global tk, ttk, filedialog, messagebox
+    if tk is None:
+        import tkinter
+        from tkinter import ttk as _ttk, filedialog as _filedialog, messagebox as _messagebox
+        tk, ttk, filedialog, messagebox = tkinter, _ttk, _filedialog, _messagebox
+    return tk
+
+class VirtualPreview:
+    """
+    Preview of a LineIndex that only renders the visible window into a Text widget:
+    scrollbar, mouse wheel and keys move the window, "Go to line" jumps and
+    "Find next" searches the whole file.
+    """
+    def __init__(self, parent):
+        self.index = None
+        self.first = 0
+        self.hit = None
+        self.frame = ttk.Frame(parent)
+
+        bar = ttk.Frame(self.frame)
+        bar.pack(fill="x")
+        ttk.Label(bar, text="Go to line:").pack(side="left")
+        self.goto_var = tk.StringVar()
+        goto = ttk.Entry(bar, textvariable=self.goto_var, width=10)
+        goto.pack(side="left", padx=(4,0))
+        goto.bind("<Return>", lambda e: self.goto())
+        ttk.Label(bar, text="Search:").pack(side="left", padx=(12,4))
+        self.search_var = tk.StringVar()
+        search = ttk.Entry(bar, textvariable=self.search_var, width=20)
+        search.pack(side="left")
+        search.bind("<Return>", lambda e: self.search_next())
+        ttk.Button(bar, text="Find next", command=self.search_next).pack(side="left", padx=(4,0))
+        self.info_var = tk.StringVar(value="")
+        ttk.Label(bar, textvariable=self.info_var).pack(side="right")
+
+        body = ttk.Frame(self.frame)
+        body.pack(fill="both", expand=True, pady=(4,0))
+        self.scroll = ttk.Scrollbar(body, orient="vertical", command=self.on_scrollbar)
+        self.scroll.pack(side="right", fill="y")
+        self.text = tk.Text(body, height=28, wrap="none", bg="#0f0f0f", fg="#dfffe6", insertbackground="#ffffff")
+        self.text.pack(side="left", fill="both", expand=True)
+        self.text.tag_configure("hit", background="#1f5f3a")
+        self.text.bind("<Configure>", lambda e: self.render())
+        self.text.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll_by(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1)):
+            self.text.bind(key, lambda e, s=step: self.scroll_by(s))
+        self.text.bind("<Prior>", lambda e: self.scroll_by(-self.visible_lines()))
+        self.text.bind("<Next>", lambda e: self.scroll_by(self.visible_lines()))
+        self.text.bind("<Control-Home>", lambda e: self.scroll_to(0))
+        self.text.bind("<Control-End>", lambda e: self.scroll_to(len(self.index) if self.index else 0))
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def visible_lines(self):
+        height = self.text.winfo_height()
+        linespace = self.text.tk.call("font", "metrics", self.text.cget("font"), "-linespace")
+        rows = int(height // max(1, int(linespace))) if height > 1 else int(self.text.cget("height"))
+        return max(1, rows)
+
+    def set_source(self, index):
+        self.index = index
+        self.first = 0
+        self.hit = None
+        self.render()
+
+    def refresh(self):
+        if self.index is not None:
+            self.index.refresh()
+            self.render()
+
+    def render(self):
+        total = len(self.index) if self.index is not None else 0
+        rows = self.visible_lines()
+        self.first = max(0, min(self.first, max(0, total - rows)))
+        lines = self.index.lines(self.first, rows) if total else []
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(lines))
+        if self.hit is not None and self.first <= self.hit < self.first + len(lines):
+            row = self.hit - self.first + 1
+            self.text.tag_add("hit", f"{row}.0", f"{row}.end")
+        self.text.config(state="disabled")
+        if total:
+            self.scroll.set(self.first / total, min(1.0, (self.first + len(lines)) / total))
+            self.info_var.set(f"lines {self.first + 1:,}-{self.first + len(lines):,} of {total:,}")
+        else:
+            self.scroll.set(0.0, 1.0)
+            self.info_var.set("")
+        return "break"
+
+    def scroll_to(self, line):
+        self.first = max(0, line)
+        return self.render()
+
+    def scroll_by(self, n):
+        return self.scroll_to(self.first + n)
+
+    def on_scrollbar(self, *args):
+        total = len(self.index) if self.index is not None else 0
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * total))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.visible_lines() if args[2] == "pages" else 1)
+            self.scroll_by(step)
+
+    def goto(self):
+        try:
+            line = int(self.goto_var.get().replace(",", "").strip()) - 1
+        except ValueError:
+            return
+        if self.index is None or not len(self.index):
+            return
+        self.hit = max(0, min(line, len(self.index) - 1))
+        self.scroll_to(self.hit)
+
+    def search_next(self):
+        term = self.search_var.get()
+        if self.index is None or not term:
+            return
+        start = self.hit + 1 if self.hit is not None else self.first
+        found = self.index.find(term, start_line=start)
+        if found is None:
+            self.info_var.set(f"'{term}' not found")
+            return
+        self.hit = found
+        self.scroll_to(found)
+
+    def clear(self):
+        self.set_source(None)
+
 class CUPPXUltimateGUI:
     def __init__(self, root):
         self.root = root
@@ -399,6 +3885,8 @@ class CUPPXUltimateGUI:
         ttk.Checkbutton(gen_ctrl, text="Use leet variants", variable=self.use_leet).pack(side="left", padx=(0,10))
         self.use_symbols = tk.BooleanVar(value=False)
         ttk.Checkbutton(gen_ctrl, text="Enable symbols", variable=self.use_symbols).pack(side="left")
+        self.ranked = tk.BooleanVar(value=False)
+        ttk.Checkbutton(gen_ctrl, text="Most likely first", variable=self.ranked).pack(side="left", padx=(10,0))
         ttk.Label(gen_ctrl, text="Max symbols per word:").pack(side="left", padx=(12,4))
         self.max_symbols_var = tk.IntVar(value=2)
         ttk.Spinbox(gen_ctrl, from_=1, to=200, textvariable=self.max_symbols_var, width=6).pack(side="left")
@@ -412,21 +3900,50 @@ class CUPPXUltimateGUI:
         # buttons
         btn_frame = ttk.Frame(right)
         btn_frame.pack(fill="x", pady=(6,8))
-        ttk.Button(btn_frame, text="Generate Wordlist", command=self.generate_wordlist).pack(side="left")
+        self.generate_btn = ttk.Button(btn_frame, text="Generate Wordlist", command=self.generate_wordlist)
+        self.generate_btn.pack(side="left")
+        self.cancel_btn = ttk.Button(btn_frame, text="Cancel", command=self.cancel_generation, state="disabled")
+        self.cancel_btn.pack(side="left", padx=(8,0))
         self.save_btn = ttk.Button(btn_frame, text="Save Wordlist", command=self.save_wordlist, state="disabled")
         self.save_btn.pack(side="left", padx=(8,0))
         ttk.Button(btn_frame, text="Clear", command=self.clear_all).pack(side="left", padx=(8,0))
 
-        # preview area
-        ttk.Label(right, text="Preview (first 500 lines):").pack(anchor="w")
-        self.preview_box = tk.Text(right, height=28, bg="#0f0f0f", fg="#dfffe6", insertbackground="#ffffff")
-        self.preview_box.pack(fill="both", expand=True, pady=(4,0))
+        # preview area (pages through the whole result on disk)
+        ttk.Label(right, text="Preview (whole list: scroll, go to line or search):").pack(anchor="w")
+        self.preview = VirtualPreview(right)
+        self.preview.pack(fill="both", expand=True, pady=(4,0))
 
         self.status_var = tk.StringVar(value="Ready.")
         ttk.Label(root, textvariable=self.status_var, background="#121212", foreground="#bdbdbd").pack(fill="x", padx=12, pady=(6,10))
 
-        self.generated = []
+        self.spool = None       # ResultSpool holding the generated words
+        self.line_index = None  # LineIndex over the spool for the preview
         self.last_output_path = None
+        self.worker = None
+        self.target_count = 0
+        self.estimate = None
+        self.stage_cache = StageCache()  # tokens / base table reused across runs of this session
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    @property
+    def generated_count(self):
+        return self.spool.count if self.spool is not None else 0
+
+    def reset_results(self):
+        self.preview.clear()
+        if self.line_index is not None:
+            self.line_index.close()
+            self.line_index = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+    def on_close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.reset_results()
+        self.root.destroy()
 
     def build_profile(self):
         prof = {}
@@ -468,68 +3985,132 @@ class CUPPXUltimateGUI:
             symbol_prob_weights = parse_prob_weights(self.symbol_prob_var.get().strip(), max_symbols)
             # if invalid, symbol_prob_weights stays None -> generator uses uniform default
 
-        # warn on very large requests
-        if target_count >= 500_000:
-            proceed = messagebox.askokcancel("Large request", f"You requested {target_count} words. This may use a lot of memory/time and may hang your machine. Continue?")
+        # size the run up front (milliseconds, nothing is generated); ask only when it
+        # cannot reach the target or is expected to be slow or memory hungry
+        order = "ranked" if self.ranked.get() else "shuffle"
+        try:
+            self.estimate = estimate_keyspace(prof, use_leet=use_leet, use_symbols=use_symbols, max_symbols=max_symbols,
+                                              target_count=target_count, symbol_prob_weights=symbol_prob_weights,
+                                              order=order, cache=self.stage_cache)
+        except Exception:
+            self.estimate = None   # the estimate never blocks a run
+        est = self.estimate
+        if est is not None and (est.short or est.seconds >= ESTIMATE_CONFIRM_SECONDS
+                                or est.memory >= ESTIMATE_CONFIRM_BYTES):
+            if est.short:
+                why = (f"This profile gives only about {est.space:,} unique words, fewer than the "
+                       f"{target_count:,} requested; every stage will run dry.")
+            else:
+                why = f"You requested {target_count:,} words."
+            proceed = messagebox.askokcancel("Large request", f"{why}\n\nExpected: {est.status_line()}.\n\nContinue?")
             if not proceed:
                 self.status_var.set("Generation cancelled by user.")
                 return
 
         self.status_var.set("Generating...")
-        self.preview_box.delete("1.0", "end")
-        self.root.update_idletasks()
+        self.reset_results()
+        self.spool = ResultSpool()
+        self.line_index = LineIndex(self.spool.path)
+        self.preview.set_source(self.line_index)
+        self.target_count = target_count
+        self.save_btn.config(state="disabled")
+        self.generate_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+
+        self.worker = GenerationWorker(prof,
+                                       use_leet=use_leet,
+                                       use_symbols=use_symbols,
+                                       max_symbols=max_symbols,
+                                       target_count=target_count,
+                                       random_seed=random.randint(1, 1_000_000_000),
+                                       symbol_prob_weights=symbol_prob_weights,
+                                       cache=self.stage_cache,
+                                       order=order)
+        self.worker.start()
+        self.root.after(50, self.poll_worker, self.worker)
 
+    def cancel_generation(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.config(state="disabled")
+            self.status_var.set(f"Cancelling... ({self.generated_count} words so far)")
+
+    def poll_worker(self, worker):
+        if worker is not self.worker:
+            return  # superseded by Clear or a newer run
+        finished = None
         try:
-            generated = generate_final_wordlist(prof,
-                                                use_leet=use_leet,
-                                                use_symbols=use_symbols,
-                                                max_symbols=max_symbols,
-                                                target_count=target_count,
-                                                random_seed=random.randint(1, 1_000_000_000),
-                                                symbol_prob_weights=symbol_prob_weights)
-            self.generated = generated
-            self.preview_box.insert("1.0", f"Generated {len(generated)} words.\n\n")
-            for i, w in enumerate(generated[:500]):
-                self.preview_box.insert("end", w + "\n")
-            if len(generated) > 500:
-                self.preview_box.insert("end", f"\n... (showing first 500 of {len(generated)})\n")
-            self.status_var.set(f"Generated {len(generated)} words. Press Save to write file.")
-            self.save_btn.config(state="normal")
-        except MemoryError:
-            self.status_var.set("Generation failed: out of memory.")
-            messagebox.showerror("Memory Error", "Generation ran out of memory. Try a smaller target or disable symbols.")
-            self.generated = []
-            self.save_btn.config(state="disabled")
-        except Exception as e:
-            self.status_var.set("Generation error.")
-            messagebox.showerror("Error", f"Failed to generate: {e}")
-            self.generated = []
+            while True:
+                kind, payload = worker.queue.get_nowait()
+                if kind == "words":
+                    self.spool.append(payload)
+                else:
+                    finished = (kind, payload)
+                    break
+        except queue.Empty:
+            pass
+        self.spool.flush()
+        self.preview.refresh()
+        if finished is None:
+            if not worker.cancelled:
+                expected = f" (expected ~{format_seconds(self.estimate.seconds)})" if self.estimate is not None else ""
+                self.status_var.set(f"Generating... {self.generated_count} / {self.target_count} words{expected} | "
+                                    f"{worker.stats.status_line()}")
+            self.root.after(50, self.poll_worker, worker)
+            return
+        self.finish_generation(*finished)
+
+    def finish_generation(self, kind, payload):
+        stats = self.worker.stats
+        self.worker = None
+        self.generate_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        n = self.generated_count
+        if kind == "error":
+            if isinstance(payload, MemoryError):
+                self.status_var.set("Generation failed: out of memory.")
+                messagebox.showerror("Memory Error", "Generation ran out of memory. Try a smaller target or disable symbols.")
+            else:
+                self.status_var.set("Generation error.")
+                messagebox.showerror("Error", f"Failed to generate: {payload}")
+            self.reset_results()
             self.save_btn.config(state="disabled")
+            return
+        done = "Cancelled after" if payload else "Generated"
+        short = not payload and self.target_count and n < self.target_count and stats.exit_reason == "exhausted"
+        what = f"{n} of {self.target_count} words (every stage ran dry)" if short else f"{n} words"
+        self.status_var.set((f"{done} {what}. Press Save to write file." if n else f"{done} 0 words.")
+                            + f"  [{stats.status_line()}]")
+        self.save_btn.config(state="normal" if n else "disabled")
 
     def save_wordlist(self):
-        if not self.generated:
+        if not self.generated_count:
             messagebox.showwarning("Warning", "No wordlist generated.")
             return
         default_base = clean_token(self.entries["first_name"].get() or "cuppx")
-        default_name = f"{default_base}_{len(self.generated)}.txt"
+        default_name = f"{default_base}_{self.generated_count}.txt"
         p = filedialog.asksaveasfilename(title="Save wordlist as", defaultextension=".txt",
                                          initialfile=default_name,
-                                         filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+                                         filetypes=[("Text files", "*.txt"), ("Gzip text", "*.txt.gz"),
+                                                    ("XZ text", "*.txt.xz"), ("All files", "*.*")])
         if not p:
             self.status_var.set("Save cancelled.")
             return
         try:
-            with open(p, "w", encoding="utf-8") as fh:
-                for w in self.generated:
-                    fh.write(w + "\n")
+            n = write_wordlist(self.spool.words(), p)
             self.last_output_path = p
-            self.status_var.set(f"Saved {len(self.generated)} words to {p}")
+            self.status_var.set(f"Saved {n} words to {p}")
             messagebox.showinfo("Saved", f"Wordlist saved to:\n{p}")
         except Exception as e:
             self.status_var.set("Save failed.")
             messagebox.showerror("Error", f"Failed to save: {e}")
 
     def clear_all(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+            self.generate_btn.config(state="normal")
+            self.cancel_btn.config(state="disabled")
         for e in self.entries.values():
             e.delete(0, "end")
         self.ent_phone.delete(0, "end")
@@ -537,18 +4118,407 @@ class CUPPXUltimateGUI:
         self.ent_email.delete(0, "end")
         self.ent_years.delete(0, "end")
         self.ent_age.delete(0, "end")
-        self.preview_box.delete("1.0", "end")
+        self.reset_results()
         self.status_var.set("Ready.")
-        self.generated = []
         self.save_btn.config(state="disabled")
 
 # -------------------------
-# Run
+# CLI
 # -------------------------
-def main():
+PROFILE_TEXT_FIELDS = ["first_name", "last_name", "partner", "pet", "company", "phone", "email", "age"]
+PROFILE_LIST_FIELDS = ["nicknames", "keywords", "add_numbers", "years"]
+
+def read_mapping_file(path):
+    # JSON, or YAML when the extension says so (PyYAML is optional)
+    with open(path, "r", encoding="utf-8") as fh:
+        text = fh.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML is required to read YAML files (pip install pyyaml)")
+        data = yaml.safe_load(text) or {}
+    else:
+        data = json.loads(text or "{}")
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping at the top level")
+    return data
+
+def load_profile_file(path):
+    """
+    Load a profile from a JSON or YAML file (same keys as the GUI profile).
+    List fields may be given as lists or as comma-separated strings.
+    """
+    return normalize_profile(read_mapping_file(path))
+
+def load_rule_config(path):
+    """
+    Load prefixes/suffixes/separators for the base rules from JSON/YAML, e.g.
+    {"suffixes": ["", "1", "123", "!"], "separators": ["", "."]}. Missing keys keep the defaults.
+    """
+    data = read_mapping_file(path)
+    unknown = set(data) - set(RULE_CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"{path}: unknown rule keys {', '.join(sorted(unknown))}")
+    conf = {}
+    for k in RULE_CONFIG_KEYS:
+        if k in data:
+            if not isinstance(data[k], list):
+                raise ValueError(f"{path}: {k} must be a list")
+            conf[k] = ["" if v is None else str(v) for v in data[k]]
+    return conf
+
+def normalize_profile(data):
+    prof = {}
+    for k in PROFILE_TEXT_FIELDS:
+        v = data.get(k)
+        prof[k] = "" if v is None else str(v).strip()
+    for k in PROFILE_LIST_FIELDS:
+        v = data.get(k)
+        if isinstance(v, (list, tuple)):
+            prof[k] = [str(it).strip() for it in v if str(it).strip()]
+        else:
+            prof[k] = split_csv_field(str(v)) if v else []
+    return prof
+
+def build_arg_parser():
+    ap = argparse.ArgumentParser(prog="CUPP-X.py",
+                                 description="CUPP-X Ultimate: personalised wordlist generator. "
+                                             "Run without arguments (or with --gui) for the GUI.")
+    ap.add_argument("--gui", action="store_true", help="start the Tkinter GUI")
+    prof = ap.add_argument_group("profile")
+    prof.add_argument("--profile", metavar="FILE", help="JSON/YAML profile; flags below override its values")
+    prof.add_argument("--first-name")
+    prof.add_argument("--last-name")
+    prof.add_argument("--nicknames", help="comma separated")
+    prof.add_argument("--partner")
+    prof.add_argument("--pet")
+    prof.add_argument("--company")
+    prof.add_argument("--keywords", help="comma separated")
+    prof.add_argument("--phone")
+    prof.add_argument("--add-numbers", help="comma separated")
+    prof.add_argument("--email")
+    prof.add_argument("--years", help="comma separated")
+    prof.add_argument("--age")
+    gen = ap.add_argument_group("generation")
+    gen.add_argument("--no-leet", dest="use_leet", action="store_false", help="disable leet variants")
+    gen.add_argument("--leet-budget", type=int, default=0, metavar="N",
+                     help="up to N partial leet forms per base word (j0hn, @lice, ...; 0 = one fully substituted form)")
+    gen.add_argument("--symbols", dest="use_symbols", action="store_true", help="enable symbol injection")
+    gen.add_argument("--max-symbols", type=int, default=2)
+    gen.add_argument("--symbol-probs", default="", help="comma separated weights for 0..max symbols")
+    gen.add_argument("--symbol-mode", choices=SYMBOL_MODES, default="auto",
+                     help="sample symbol positions, enumerate them all, or auto (enumerate small spaces)")
+    gen.add_argument("-n", "--target", type=int, default=DEFAULT_WORD_CAP,
+                     help=f"number of words (0 = everything; default {DEFAULT_WORD_CAP})")
+    gen.add_argument("--seed", type=int, default=None, help="random seed for reproducible output")
+    gen.add_argument("--order", choices=ORDERS, default="shuffle",
+                     help="shuffle: stage by stage in seeded random order; ranked: most likely words first")
+    gen.add_argument("--weights", metavar="FILE",
+                     help="JSON/YAML likelihood weights for --order ranked (source / transform / symbols)")
+    gen.add_argument("-j", "--workers", type=int, default=1,
+                     help="worker processes (0 = one per CPU); output is reproducible per seed and worker count")
+    gen.add_argument("--rules", metavar="FILE", help="JSON/YAML with prefixes/suffixes/separators lists for the base rules")
+    gen.add_argument("--dedup", choices=DEDUP_MODES, default="set",
+                     help="dedup backend: set (exact strings), hash (exact 64-bit hashes, ~5x less RAM), "
+                          "bloom (approximate, ~50x less RAM), spill (hashes spilled to disk)")
+    gen.add_argument("--bloom-fp", type=float, default=0.001,
+                     help="false-positive rate for --dedup bloom and --exclusion-format bloom")
+    gen.add_argument("--spill-dir", default=None, help="directory for --dedup spill runs (default: system temp)")
+    gen.add_argument("--cache-dir", default=None,
+                     help="keep expanded tokens and base tables here and reuse them in later runs")
+    gen.add_argument("--cache-max-mb", type=int, default=512, help="size cap for --cache-dir (oldest entries go first)")
+    gen.add_argument("--checkpoint", metavar="FILE",
+                     help="save progress to FILE while writing -o; if FILE exists, resume that run "
+                          "or top the list up to the new --target")
+    gen.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="words between checkpoints")
+    pol = ap.add_argument_group("password policy (applied during generation)")
+    pol.add_argument("--min-len", type=int, default=0, help="minimum word length")
+    pol.add_argument("--max-len", type=int, default=0, help="maximum word length (0 = none)")
+    pol.add_argument("--require", default="", help="comma separated classes every word needs: " + ",".join(CHAR_CLASSES))
+    pol.add_argument("--ban", default="", metavar="CHARS", help="characters no word may contain")
+    pol.add_argument("--case", default="", help="comma separated case transforms: " + ",".join(CASE_TRANSFORMS)
+                     + " (default lower, or capitalize,upper when upper is required)")
+    excl = ap.add_argument_group("exclusion dictionaries")
+    excl.add_argument("--exclude", metavar="INDEX", action="append", default=[],
+                      help="never emit words listed in this exclusion index (repeatable; see --build-exclusion)")
+    excl.add_argument("--build-exclusion", metavar="INDEX",
+                      help="build an exclusion index from the --dict files and exit")
+    excl.add_argument("--dict", metavar="FILE", action="append", default=[],
+                      help="dictionary for --build-exclusion, one word per line (.gz/.xz read directly; repeatable)")
+    excl.add_argument("--exclusion-format", choices=EXCLUSION_FORMATS, default="sorted",
+                      help="sorted: exact, 8 bytes per word; bloom: ~1.8 bytes per word at --bloom-fp 0.001")
+    batch = ap.add_argument_group("batch (many profiles)")
+    batch.add_argument("--batch", metavar="FILE",
+                       help="CSV/JSONL with one profile per row/line (optional id and target_count columns); "
+                            "writes one wordlist per profile, -j profiles at a time")
+    batch.add_argument("--out-dir", default="cuppx-batch", help="directory for the per-profile lists of --batch")
+    batch.add_argument("--merged", metavar="FILE",
+                       help="also merge the --batch lists into one deduplicated FILE plus a word<TAB>profiles TSV")
+    out = ap.add_argument_group("output")
+    out.add_argument("-o", "--output", default="-", help="output file ('-' = stdout, the default); stdout and named pipes are streamed in large blocks")
+    out.add_argument("--compress", choices=COMPRESSIONS, default="auto",
+                     help="output compression (auto = by extension: .gz, .xz, .zst)")
+    out.add_argument("-q", "--quiet", action="store_true", help="do not print the timing summary")
+    out.add_argument("--export-rules", metavar="PREFIX",
+                     help="instead of expanding, write PREFIX.words.txt + PREFIX.rule for hashcat/john")
+    out.add_argument("--rule-format", choices=RULE_FORMATS, default="hashcat", help="format for --export-rules")
+    out.add_argument("--stats", action="store_true", help="print per-stage counters, timings and exit reasons")
+    out.add_argument("--estimate", action="store_true",
+                     help="print the expected unique words, runtime, memory and supplying stage per stage "
+                          "without generating anything, then exit")
+    out.add_argument("--cprofile", metavar="FILE", help="run under cProfile and dump the stats to FILE")
+    out.add_argument("--tracemalloc", action="store_true", help="trace allocations and print peak memory / top sites")
+    return ap
+
+def profile_from_args(args):
+    data = load_profile_file(args.profile) if args.profile else normalize_profile({})
+    for k in PROFILE_TEXT_FIELDS + PROFILE_LIST_FIELDS:
+        v = getattr(args, k)
+        if v is not None:
+            data[k] = split_csv_field(v) if k in PROFILE_LIST_FIELDS else v.strip()
+    return data
+
+def run_cli(args):
+    ap = build_arg_parser()
+    if args.build_exclusion:
+        return run_build_exclusion(args, ap)
+    try:
+        prof = profile_from_args(args)
+        rule_config = load_rule_config(args.rules) if args.rules else None
+        score_weights = load_score_weights(args.weights) if args.weights else None
+        policy = parse_policy(args.min_len, args.max_len, args.require, args.ban, args.case)
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    if args.use_symbols and args.max_symbols < 1:
+        ap.error("--max-symbols must be >= 1 when --symbols is set")
+    if args.target < 0:
+        ap.error("--target must be >= 0")
+    if not 0 < args.bloom_fp < 1:
+        ap.error("--bloom-fp must be between 0 and 1")
+    if args.workers < 0:
+        ap.error("--workers must be >= 0")
+    if args.cache_max_mb < 1:
+        ap.error("--cache-max-mb must be >= 1")
+    if args.leet_budget < 0:
+        ap.error("--leet-budget must be >= 0")
+    if args.leet_budget and args.order != "shuffle":
+        ap.error("--leet-budget needs --order shuffle")
+    if args.checkpoint and (is_stream_path(args.output) or args.workers != 1 or args.order != "shuffle" or policy):
+        ap.error("--checkpoint needs -o FILE (not a pipe), a single worker, --order shuffle and no password policy")
+    if args.checkpoint_every < 1:
+        ap.error("--checkpoint-every must be >= 1")
+    if args.batch and (args.checkpoint or args.export_rules or args.profile or args.estimate):
+        ap.error("--batch cannot be combined with --checkpoint, --export-rules, --profile or --estimate")
+    if args.export_rules:
+        return run_export_rules(args, prof, rule_config)
+    if args.estimate:
+        return run_estimate(args, prof, rule_config, policy)
+    try:
+        exclude = Exclusions(args.exclude) if args.exclude else None
+    except (OSError, ValueError) as e:
+        ap.error(f"--exclude: {e}")
+
+    symbol_prob_weights = None
+    if args.use_symbols:
+        symbol_prob_weights = parse_prob_weights(args.symbol_probs.strip(), args.max_symbols)
+
+    if args.batch:
+        try:
+            return run_batch_cli(args, ap, rule_config, score_weights, policy, symbol_prob_weights, exclude)
+        finally:
+            if exclude is not None:
+                exclude.close()
+    cache = None
+    if args.cache_dir:
+        try:
+            cache = StageCache(disk_dir=args.cache_dir, disk_max_bytes=args.cache_max_mb << 20)
+        except OSError as e:
+            ap.error(f"--cache-dir: {e}")
+    dedup = make_dedup(args.dedup, capacity=args.target, fp_rate=args.bloom_fp, spill_dir=args.spill_dir)
+    gen_kwargs = dict(use_leet=args.use_leet,
+                      use_symbols=args.use_symbols,
+                      max_symbols=args.max_symbols,
+                      target_count=args.target,
+                      random_seed=args.seed,
+                      symbol_prob_weights=symbol_prob_weights,
+                      dedup=dedup,
+                      rule_config=rule_config,
+                      symbol_mode=args.symbol_mode,
+                      stats=GenerationStats(),
+                      cache=cache,
+                      order=args.order,
+                      score_weights=score_weights,
+                      policy=policy,
+                      leet_budget=args.leet_budget,
+                      exclude=exclude)
+    # ranked order is one best-first walk, it does not shard
+    workers = (args.workers or os.cpu_count() or 1) if args.order == "shuffle" else 1
+    est = None
+    if not args.quiet and not args.checkpoint:
+        try:
+            est = estimate_for_args(args, prof, rule_config, policy)
+        except Exception:
+            est = None   # the estimate never blocks a run
+    if est is not None:
+        if not args.target:
+            print(f"[cuppx] note: -n 0 runs every stage to the end: about {est.words:,} words in "
+                  f"~{format_seconds(est.seconds)} (see --estimate)", file=sys.stderr)
+        elif est.short:
+            print(f"[cuppx] note: this profile gives only about {est.space:,} unique words, fewer than "
+                  f"--target {args.target:,}; every stage will run dry, in ~{format_seconds(est.seconds)} "
+                  f"(see --estimate)", file=sys.stderr)
+    if args.checkpoint:
+        words = None
+    elif workers > 1:
+        words = iter_parallel_wordlist(prof, workers=workers, shard_dedup=args.dedup, **gen_kwargs)
+    else:
+        words = iter_final_wordlist(prof, **gen_kwargs)
+    t0 = time.perf_counter()
+    added = None
+    complete = True
+    try:
+        with profiled(args.cprofile, args.tracemalloc):
+            if args.checkpoint:
+                count, added = write_resumable(prof, args.output, args.checkpoint,
+                                               every=args.checkpoint_every, **gen_kwargs)
+            else:
+                count, complete = emit_words(words, args.output, args.compress)
+    except (OSError, ValueError) as e:
+        print(f"[cuppx] error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        dedup.close()
+        if exclude is not None:
+            exclude.close()
+    elapsed = time.perf_counter() - t0
+    if args.stats:
+        print(gen_kwargs["stats"].summary(), file=sys.stderr)
+        if cache is not None and workers == 1:
+            print(cache.summary(), file=sys.stderr)
+    if not args.quiet:
+        new = count if added is None else added
+        rate = new / elapsed if elapsed > 0 else 0.0
+        dest = "stdout" if args.output == "-" else args.output
+        print(f"[cuppx] {new} words -> {dest} in {elapsed:.3f}s ({rate:,.0f} words/sec)", file=sys.stderr)
+        if not complete:
+            print(f"[cuppx] the reader closed {dest} early; generation stopped", file=sys.stderr)
+        elif args.target and count < args.target and gen_kwargs["stats"].exit_reason == "exhausted":
+            print(f"[cuppx] note: only {count:,} of --target {args.target:,} words: every stage ran dry",
+                  file=sys.stderr)
+        if added is not None:
+            print(f"[cuppx] {dest} now holds {count} words; progress saved to {args.checkpoint}", file=sys.stderr)
+    return 0
+
+def run_build_exclusion(args, ap):
+    if not args.dict:
+        ap.error("--build-exclusion needs at least one --dict FILE")
+    if not 0 < args.bloom_fp < 1:
+        ap.error("--bloom-fp must be between 0 and 1")
+    t0 = time.perf_counter()
+    try:
+        rep = build_exclusion_index(args.dict, args.build_exclusion, fmt=args.exclusion_format,
+                                    fp_rate=args.bloom_fp, tmp_dir=args.spill_dir)
+    except (OSError, ValueError) as e:
+        print(f"[cuppx] error: {e}", file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print(f"[cuppx] {rep['lines']:,} dictionary lines -> {rep['entries']:,} {rep['format']} entries, "
+              f"{rep['bytes']:,} bytes -> {args.build_exclusion} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return 0
+
+def run_export_rules(args, prof, rule_config):
+    rep = export_cracker_rules(prof, args.export_rules, use_leet=args.use_leet,
+                               rule_config=rule_config, fmt=args.rule_format)
+    if not args.quiet:
+        print(f"[cuppx] {rep['words']} words -> {rep['words_path']}, {rep['rules']} rules -> {rep['rule_path']}",
+              file=sys.stderr)
+        print(f"[cuppx] the cracker's full words x rules expansion is {rep['expanded_words']:,} candidates / "
+              f"{rep['expanded_bytes']:,} bytes, export is {rep['export_bytes']:,} bytes ({rep['ratio']:,.1f}x smaller "
+              f"than that expansion; the generator's own base and leet stages hold ~{rep['generated_words']:,} words)",
+              file=sys.stderr)
+        if args.use_symbols:
+            print("[cuppx] note: symbol injection and token pairs are not exported "
+                  "(use hashcat -a 1 words words for pairs)", file=sys.stderr)
+    return 0
+
+def estimate_for_args(args, prof, rule_config, policy):
+    symbol_prob_weights = parse_prob_weights(args.symbol_probs.strip(), args.max_symbols) if args.use_symbols else None
+    return estimate_keyspace(prof, use_leet=args.use_leet, use_symbols=args.use_symbols, max_symbols=args.max_symbols,
+                             target_count=args.target, symbol_prob_weights=symbol_prob_weights, dedup=args.dedup,
+                             rule_config=rule_config, symbol_mode=args.symbol_mode, order=args.order, policy=policy,
+                             leet_budget=args.leet_budget, workers=args.workers or os.cpu_count() or 1)
+
+def run_estimate(args, prof, rule_config, policy):
+    print(estimate_for_args(args, prof, rule_config, policy).summary())
+    return 0
+
+def run_batch_cli(args, ap, rule_config, score_weights, policy, symbol_prob_weights, exclude):
+    try:
+        records = load_batch_profiles(args.batch, target_count=args.target)
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    if not records:
+        ap.error(f"{args.batch}: no profiles")
+    gen_kwargs = dict(use_leet=args.use_leet, use_symbols=args.use_symbols, max_symbols=args.max_symbols,
+                      random_seed=args.seed, symbol_prob_weights=symbol_prob_weights, dedup=args.dedup,
+                      rule_config=rule_config, symbol_mode=args.symbol_mode, order=args.order,
+                      score_weights=score_weights, policy=policy, leet_budget=args.leet_budget, exclude=exclude)
+    suffix = ".txt" + {"gzip": ".gz", "xz": ".xz", "zstd": ".zst"}.get(args.compress, "")
+
+    def progress(done, total, res):
+        if args.quiet:
+            return
+        short = " (space exhausted)" if res["target"] and res["words"] < res["target"] else ""
+        print(f"[cuppx] [{done}/{total}] {res['id']}: {res['words']:,} words in {res['seconds']:.2f}s{short}",
+              file=sys.stderr)
+
+    try:
+        with profiled(args.cprofile, args.tracemalloc):
+            rep = run_batch(records, args.out_dir, workers=args.workers, merged_path=args.merged,
+                            compression=args.compress, suffix=suffix, progress=progress,
+                            cache_dir=args.cache_dir, cache_max_bytes=args.cache_max_mb << 20, **gen_kwargs)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"[cuppx] error: {e}", file=sys.stderr)
+        return 1
+    if args.stats:
+        for res in rep["results"]:
+            print(f"{res['id']}: " + ", ".join(f"{st['name']} {st['accepted']:,} ({st['exit']})"
+                                               for st in res["stats"]["stages"]), file=sys.stderr)
+    if not args.quiet:
+        print(f"[cuppx] {rep['profiles']} profiles, {rep['words']:,} words -> {args.out_dir} in {rep['seconds']:.3f}s",
+              file=sys.stderr)
+        if rep["merged_path"]:
+            print(f"[cuppx] merged: {rep['merged_words']:,} unique words -> {rep['merged_path']}, "
+                  f"provenance -> {rep['counts_path']}", file=sys.stderr)
+    return 0
+
+def emit_words(words, output, compression="auto"):
+    # (words written, False if the reader of a pipe / stdout went away first)
+    if is_stream_path(output):
+        with PipeWriter(output, compression) as out:
+            out.write_many(words)
+        return out.count, not out.broken
+    return write_wordlist(words, output, compression=compression), True
+
+def run_gui():
+    load_tk()
     root = tk.Tk()
     app = CUPPXUltimateGUI(root)
     root.mainloop()
+    return 0
+
+# -------------------------
+# Run
+# -------------------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        return run_gui()
+    args = build_arg_parser().parse_args(argv)
+    if args.gui:
+        return run_gui()
+    return run_cli(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
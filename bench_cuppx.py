@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# CUPP-X benchmark harness
+# Times every generation stage and the save path on synthetic profiles of
+# increasing size, one forked child per case (so peak RSS is per case), and
+# writes the results as JSON for comparing runs between commits.
+#
+#   python3 bench_cuppx.py --quick
+#   python3 bench_cuppx.py --sizes m,l --targets 10000,1000000 --out before.json
+#   python3 bench_cuppx.py --out after.json --compare before.json
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_cuppx():
+    # CUPP-X.py is not an importable module name
+    spec = importlib.util.spec_from_file_location("cuppx", os.path.join(HERE, "CUPP-X.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+cuppx = load_cuppx()
+
+# -------------------------
+# SYNTHETIC PROFILES
+# -------------------------
+# size -> (keywords, nicknames, phones)
+PROFILE_SIZES = {
+    "s": (2, 1, 1),
+    "m": (8, 3, 2),
+    "l": (24, 6, 4),
+    "xl": (64, 12, 8),
+}
+DEFAULT_TARGETS = [10_000, 100_000, 1_000_000, 10_000_000]
+STAGES = ["expand_profile_tokens", "base_permutations", "leet", "pairs", "phone",
+          "symbols", "extras", "generate", "save"]
+SYLLABLES = ["ka", "ro", "mi", "tan", "lee", "so", "var", "en", "dy", "max", "ju", "pi", "ne", "tor", "la", "bo"]
+
+def synthetic_profile(size):
+    n_kw, n_nick, n_phone = PROFILE_SIZES[size]
+    rng = random.Random(f"cuppx-bench-{size}")
+
+    def word():
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+    return {
+        "first_name": "john", "last_name": "doe", "partner": "alice", "pet": "rocky",
+        "company": "acme", "email": "jdoe@example.com", "age": "31", "years": ["1994"],
+        "nicknames": [word() for _ in range(n_nick)],
+        "keywords": [word() for _ in range(n_kw)],
+        "phone": "0" + "".join(rng.choice("0123456789") for _ in range(10)),
+        "add_numbers": ["".join(rng.choice("0123456789") for _ in range(rng.randint(3, 8)))
+                        for _ in range(n_phone - 1)],
+    }
+
+def profile_parts(profile):
+    tokens = cuppx.expand_profile_tokens(profile)
+    table = cuppx.compile_base_rules(tokens, cuppx.profile_years(profile), cuppx.profile_phones(profile))
+    return tokens, table
+
+# -------------------------
+# STAGE CASES
+# -------------------------
+# each returns (proposed, accepted): candidates offered to the dedup and how many were new
+def feed(words, target, normalize=cuppx.clean_token):
+    # normalise + dedup like iter_final_wordlist does
+    seen = cuppx.SetDedup()
+    proposed = accepted = 0
+    for w in words:
+        proposed += 1
+        w = normalize(w)
+        if w and seen.add(w):
+            accepted += 1
+            if target and accepted >= target:
+                break
+    return proposed, accepted
+
+def case_expand_profile_tokens(profile, target):
+    reps = max(1, min(target, 10_000))
+    for _ in range(reps):
+        cuppx.expand_profile_tokens(profile)
+    return reps, reps
+
+def case_base_permutations(profile, target):
+    tokens = cuppx.expand_profile_tokens(profile)
+    table = cuppx.compile_base_rules(tokens, cuppx.profile_years(profile), cuppx.profile_phones(profile))
+    return feed(table, target)
+
+def case_leet(profile, target):
+    _, table = profile_parts(profile)
+    return feed((lv for lv in map(cuppx.leet_variants, table) if lv), target)
+
+def case_pairs(profile, target):
+    _, table = profile_parts(profile)
+    return feed(cuppx.iter_token_pairs(list(table), [""], random.Random(1)), target)
+
+def case_phone(profile, target):
+    phones = cuppx.profile_phones(profile)
+    return feed((v for p in phones for v in (p, p[-4:])), target)
+
+def case_symbols(profile, target):
+    _, table = profile_parts(profile)
+    injector = cuppx.SymbolInjector(2, cuppx.SYMBOL_CHARS, random.Random(1))
+    keep = frozenset(cuppx.SYMBOL_CHARS)
+
+    # one pass over the seeds: a target above the symbol space ends short instead of
+    # spinning on duplicates until the case times out
+    words = (v for seed in table for v in injector.variants(seed))
+    return feed(words, target, lambda w: cuppx.clean_token(w, keep=keep))
+
+def case_extras(profile, target):
+    _, table = profile_parts(profile)
+    return feed(cuppx.iter_token_pairs(list(table), [".", "_"], random.Random(1)), target)
+
+def case_generate(profile, target):
+    stats = cuppx.GenerationStats()
+    n = 0
+    for _ in cuppx.iter_final_wordlist(profile, use_symbols=True, target_count=target, random_seed=1, stats=stats):
+        n += 1
+    proposed = sum(st.proposed for st in stats.stages.values())
+    return proposed, n, None, stats.as_dict()["stages"]
+
+def case_save(profile, target):
+    words = cuppx.generate_final_wordlist(profile, use_symbols=True, target_count=target, random_seed=1)
+    fd, path = tempfile.mkstemp(prefix="cuppx-bench-", suffix=".txt")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        n = cuppx.write_wordlist(words, path)
+        # only the write is timed, see run_case
+        return n, n, time.perf_counter() - t0, None
+    finally:
+        os.remove(path)
+
+CASES = {name: globals()["case_" + name] for name in STAGES}
+
+# -------------------------
+# RUNNER
+# -------------------------
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_case(stage, size, target, out):
+    try:
+        profile = synthetic_profile(size)
+        rss0 = peak_rss_mb()
+        t0 = time.perf_counter()
+        res = CASES[stage](profile, target)
+        secs = time.perf_counter() - t0
+        # cases return (proposed, accepted) or (proposed, accepted, own_seconds, per-stage stats)
+        proposed, accepted = res[:2]
+        own_secs, stages = res[2:] if len(res) == 4 else (None, None)
+        if own_secs is not None:
+            secs = own_secs
+        out.put({
+            "stage": stage, "size": size, "target": target,
+            "proposed": proposed, "accepted": accepted, "seconds": round(secs, 6),
+            "words_per_sec": round(accepted / secs, 1) if secs > 0 else None,
+            "dup_rejection_rate": round(1 - accepted / proposed, 4) if proposed else 0.0,
+            "peak_rss_mb": peak_rss_mb(), "start_rss_mb": rss0,
+            "stages": stages,
+        })
+    except Exception:
+        out.put({"stage": stage, "size": size, "target": target, "error": traceback.format_exc()})
+
+def run_isolated(stage, size, target, timeout):
+    ctx = multiprocessing.get_context("fork") if hasattr(os, "fork") else multiprocessing.get_context()
+    out = ctx.Queue()
+    proc = ctx.Process(target=run_case, args=(stage, size, target, out))
+    proc.start()
+    try:
+        return out.get(timeout=timeout)
+    except Exception:
+        return {"stage": stage, "size": size, "target": target, "error": f"timeout after {timeout}s"}
+    finally:
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        base = json.load(fh)
+    old = {(r["stage"], r["size"], r["target"]): r for r in base.get("results", []) if "error" not in r}
+    print(f"\nvs {baseline_path} ({base.get('commit')}):")
+    for r in results:
+        o = old.get((r["stage"], r["size"], r["target"]))
+        if not o or "error" in r or not o.get("words_per_sec") or not r.get("words_per_sec"):
+            continue
+        speed = r["words_per_sec"] / o["words_per_sec"]
+        rss = (r["peak_rss_mb"] / o["peak_rss_mb"]) if r.get("peak_rss_mb") and o.get("peak_rss_mb") else None
+        flag = "  <-- slower" if speed < 0.9 else ""
+        rss_txt = f"{rss:5.2f}x rss" if rss else ""
+        print(f"  {r['stage']:<22}{r['size']:<4}{r['target']:>10}  {speed:5.2f}x speed  {rss_txt}{flag}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="CUPP-X stage benchmarks (JSON results)")
+    ap.add_argument("--sizes", default=",".join(PROFILE_SIZES), help="profile sizes: " + ",".join(PROFILE_SIZES))
+    ap.add_argument("--targets", default=",".join(map(str, DEFAULT_TARGETS)), help="comma separated word targets")
+    ap.add_argument("--stages", default=",".join(STAGES), help="subset of: " + ",".join(STAGES))
+    ap.add_argument("--quick", action="store_true", help="sizes s,m and targets 10000,100000")
+    ap.add_argument("--timeout", type=float, default=3600, help="seconds per case")
+    ap.add_argument("--out", default="bench_results.json", help="JSON results file")
+    ap.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    args = ap.parse_args(argv)
+
+    sizes = ["s", "m"] if args.quick else [s for s in args.sizes.split(",") if s]
+    targets = [10_000, 100_000] if args.quick else [int(t) for t in args.targets.split(",") if t]
+    stages = [s for s in args.stages.split(",") if s]
+    for s in sizes:
+        if s not in PROFILE_SIZES:
+            ap.error(f"unknown size {s!r}")
+    for s in stages:
+        if s not in CASES:
+            ap.error(f"unknown stage {s!r}")
+
+    results = []
+    print(f"{'stage':<22}{'size':<5}{'target':>10}{'accepted':>11}{'words/s':>12}{'dup%':>7}{'peakMB':>8}")
+    for size in sizes:
+        for target in targets:
+            for stage in stages:
+                r = run_isolated(stage, size, target, args.timeout)
+                results.append(r)
+                if "error" in r:
+                    print(f"{stage:<22}{size:<5}{target:>10}  ERROR {r['error'].strip().splitlines()[-1]}")
+                    continue
+                rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+                print(f"{stage:<22}{size:<5}{target:>10}{r['accepted']:>11}{r['words_per_sec'] or 0:>12,.0f}"
+                      f"{100 * r['dup_rejection_rate']:>6.1f}%{rss:>8}")
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=1)
+    print(f"\nresults written to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# CUPP-X regression tests
+#
+#   python3 -m pytest -q test_cuppx.py      (or: python3 test_cuppx.py)
+
+import importlib.util
+import itertools
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_cuppx():
+    # CUPP-X.py is not an importable module name
+    spec = importlib.util.spec_from_file_location("cuppx", os.path.join(HERE, "CUPP-X.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+cuppx = load_cuppx()
+
+PROFILE = {"first_name": "john", "last_name": "doe", "pet": "rocky", "years": ["1994"], "phone": "5551234"}
+
+class EstimateTest(unittest.TestCase):
+    def test_large_max_symbols(self):
+        # per-word symbol spaces outgrow a float long before 200 symbols
+        for mode in ("auto", "sample", "exhaustive"):
+            est = cuppx.estimate_keyspace(PROFILE, use_symbols=True, max_symbols=200, target_count=5000,
+                                          symbol_mode=mode)
+            self.assertEqual(est.words, 5000)
+            self.assertGreater(est.stages["symbols"].supplied, 0)
+
+class SymbolInjectorTest(unittest.TestCase):
+    def test_tail_first_is_reversed_canonical_order(self):
+        word = "rocky"
+        plain = cuppx.SymbolInjector(2, "!@", random.Random(1), mode="exhaustive")
+        tail = cuppx.SymbolInjector(2, "!@", random.Random(1), mode="exhaustive", tail_first=True)
+        for k in range(0, 3):
+            slots = list(itertools.combinations(range(len(word) + k), k))
+            self.assertEqual(list(cuppx.combinations_descending(len(word) + k, k)), slots[::-1])
+        self.assertEqual(sorted(plain.variants(word)), sorted(tail.variants(word)))
+
+    def test_tail_first_streams(self):
+        # C(58, 6) slot sets: listing them before the first variant would take ~40M tuples
+        word = "abcdefghijklmnopqrstuvwxyz" * 2
+        injector = cuppx.SymbolInjector(6, "!@", random.Random(1), [0.0] * 6 + [1.0], mode="exhaustive",
+                                        tail_first=True)
+        first = list(itertools.islice(injector.variants(word), 3))
+        self.assertEqual(first, [word + "!!!!!!", word + "!!!!!@", word + "!!!!@!"])
+
+class ExclusionTest(unittest.TestCase):
+    def test_excluded_words_are_no_symbol_seeds_under_a_policy(self):
+        # a small table, walked to the end: every seed's one-symbol variants come out
+        profile = {"first_name": "rocky", "pet": "max"}
+        rule_config = {"prefixes": [""], "suffixes": [""], "separators": [""]}
+        symbols = frozenset(cuppx.SYMBOL_CHARS)
+        for policy in (cuppx.PasswordPolicy(min_len=3), cuppx.PasswordPolicy(min_len=3, require=("symbol",))):
+            words = list(cuppx.iter_final_wordlist(profile, use_symbols=True, max_symbols=1, target_count=0,
+                                                   random_seed=1, rule_config=rule_config, symbol_mode="exhaustive",
+                                                   policy=policy, exclude={"rocky"}))
+            stripped = {"".join(c for c in w if c not in symbols) for w in words if symbols.intersection(w)}
+            self.assertIn("max", stripped)
+            self.assertNotIn("rocky", stripped)
+
+class CheckpointTest(unittest.TestCase):
+    def test_saves_land_on_every(self):
+        saved = []
+        real_save = cuppx.Checkpoint.save
+        def save(checkpoint, path, **extra):
+            state = real_save(checkpoint, path, **extra)
+            saved.append(state["emitted"])
+            return state
+        with tempfile.TemporaryDirectory() as d, mock.patch.object(cuppx.Checkpoint, "save", save):
+            out, ck = os.path.join(d, "out.txt"), os.path.join(d, "out.ck")
+            count, added = cuppx.write_resumable(PROFILE, out, ck, target_count=12000, every=5000, random_seed=1)
+            with open(out, encoding="utf-8") as fh:
+                lines = sum(1 for _ in fh)
+        self.assertEqual((count, added, lines), (12000, 12000, 12000))
+        self.assertEqual(saved, [5000, 10000, 12000])
+
+if __name__ == "__main__":
+    unittest.main()